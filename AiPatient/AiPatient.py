@@ -4,12 +4,16 @@ from tensorflow.keras.losses import MeanSquaredError
 from sklearn.preprocessing import StandardScaler
 import pandas as pd
 import numpy as np
+import copy
+import os
+import pickle
+
+from AiPatient.ModelInputs import feature_columns, modelPath, scalerFile
 
 
 #Body weight is not provided in initial dataset so we're gonna estimate an avg weighted male at 75kg
+bodyWeight = 75
 
-feature_columns = ['glucose', 'calories', 'heart_rate', 'steps', 'basal_rate', 'carb_input']
-        
 targetGlucose = 115.0
 
 maxDosage = 10.0
@@ -17,13 +21,22 @@ maxPerHour = 10.0
 
 DIA = 200 #Duration insulin Action (el w2t eli el insulin byb2a f3al feh) 200 d2ee2a 3.3 hours 
 
+carb_factor = 1.5  # mg/dL increase per gram absorbed (tunable)
+
+tddPerKg = 0.5
+
+
+def predictBolusBatch(patients):
+    """One model call for the next-step bolus of several patients (they are assumed to share the same model file)."""
+    if not patients:
+        return np.zeros(0)
+    inputs = np.stack([patient._scaledModelInput() for patient in patients])
+    return patients[0]._predictionModel.predict(inputs, verbose=0)[:, 0]
+
 
 class AiPatient():
-    def __init__(self):
-        self._bodyWeight = 75
-        self._TDD = 0.5 * self._bodyWeight #total daily insulin dose
-        self._ICR = 500 / self._TDD  #insulin2Carb ratio
-        self._ISF = 1800 / self._TDD #insulin sensitivity
+    def __init__(self, seed=None, modelPath=modelPath, **parameters):
+        self.setParameters(**parameters)
         self._totalDeliveredInsulin = 0
 
 
@@ -34,11 +47,18 @@ class AiPatient():
         self._lastReadingsBuffer = self._sensorData.head(12)
         
 
-        self.__scaler = StandardScaler()
-        self.__scaler.fit(self._sensorData[feature_columns])        
+        # A retrained model ships with the scaler it was trained with; the bundled one was
+        # trained with a scaler fitted on this patient's data
+        scalerPath = os.path.join(os.path.dirname(modelPath), scalerFile)
+        if os.path.exists(scalerPath):
+            with open(scalerPath, 'rb') as f:
+                self.__scaler = pickle.load(f)
+        else:
+            self.__scaler = StandardScaler()
+            self.__scaler.fit(self._sensorData[feature_columns])
 
         try:
-            self._predictionModel = load_model('./AiPatient/PatientData/glucose_lstm_model.h5', custom_objects={'mse': MeanSquaredError()})
+            self._predictionModel = load_model(modelPath, custom_objects={'mse': MeanSquaredError()})
         except:
             Exception("Failed to Load Glucose Prediction Model!")
 
@@ -47,6 +67,35 @@ class AiPatient():
         self._carb_absorption_minutes = 120  # typical gastric emptying window ~1.5h
         self._carb_events = []  # list of {"remaining_steps": int, "grams_per_step": float}
 
+        # Own generator (instead of the global np.random) so the noise can be snapshotted and forked
+        self._rng = np.random.default_rng(seed)
+
+    def setParameters(self, bodyWeight=bodyWeight, tddPerKg=tddPerKg, DIA=DIA, maxDosage=maxDosage,
+                      targetGlucose=targetGlucose, carb_factor=carb_factor):
+        """Set the tunable dosing/dynamics parameters; defaults are the module-level values.
+
+        `_TDD`, `_ICR` and `_ISF` are re-derived from the body weight.
+        """
+        self._bodyWeight = bodyWeight
+        self._tddPerKg = tddPerKg
+        self._DIA = DIA
+        self._maxDosage = maxDosage
+        self._targetGlucose = targetGlucose
+        self._carbFactor = carb_factor
+        self._TDD = tddPerKg * self._bodyWeight #total daily insulin dose
+        self._ICR = 500 / self._TDD  #insulin2Carb ratio
+        self._ISF = 1800 / self._TDD #insulin sensitivity
+
+    def getParameters(self):
+        return {
+            "bodyWeight": self._bodyWeight,
+            "tddPerKg": self._tddPerKg,
+            "DIA": self._DIA,
+            "maxDosage": self._maxDosage,
+            "targetGlucose": self._targetGlucose,
+            "carb_factor": self._carbFactor,
+        }
+
     def _updateTDD(self):
         alfa = 0.8
         self._TDD = alfa*self._TDD+(1-alfa)*self._totalDeliveredInsulin
@@ -61,16 +110,16 @@ class AiPatient():
     def _updateGlucose(self, glucose, bolus, carbs_absorbed, steps):
          step_duration = self._step_minutes  # minutes per step
          # Moderate carb effect per gram and distribute via absorption
-         carb_factor = 1.5  # mg/dL increase per gram absorbed (tunable)
+         carb_factor = self._carbFactor
          insulinSensitivity = self._ISF
          activityFactor = 0.002
          noiseStd = 1.5
      
          # scale insulin effect by duration / DIA
-         insulin_effect = bolus * insulinSensitivity * (step_duration / DIA)
+         insulin_effect = bolus * insulinSensitivity * (step_duration / self._DIA)
      
          change = carbs_absorbed * carb_factor - insulin_effect - steps * activityFactor
-         noise = np.random.normal(0, noiseStd)
+         noise = self._rng.normal(0, noiseStd)
 
          # floor BG to physiological minimum
          return max(glucose + change + noise, 40)
@@ -98,15 +147,15 @@ class AiPatient():
 
     def suggestDose(self, currentGlucose, carbIntake, modelPredictedGlucose=None):
         mealBolus = carbIntake / self._ICR if carbIntake > 0 else 0
-        rawCorrection = (currentGlucose-targetGlucose) / self._ISF
+        rawCorrection = (currentGlucose-self._targetGlucose) / self._ISF
 
         if modelPredictedGlucose is not None:
-            predectidedCorrectionBolus = (modelPredictedGlucose-targetGlucose) / self._ISF
+            predectidedCorrectionBolus = (modelPredictedGlucose-self._targetGlucose) / self._ISF
             actualCorrection = max(rawCorrection, predectidedCorrectionBolus)
         else:
             actualCorrection = rawCorrection        #this doesn't include any mealBolus data!!!! This also doesn't factor current insulin on board!!! (IMPORTANT WAWA)
         
-        finalBolus = max(0, min(maxDosage, actualCorrection))
+        finalBolus = max(0, min(self._maxDosage, actualCorrection))
         return finalBolus
     
     def _predictBolusNextStep(self, buffer):
@@ -114,7 +163,11 @@ class AiPatient():
         bolus = self._predictionModel.predict(scaledBuffer)[0][0]
         return bolus
 
-    def simulateStep(self, carbIntake=0):
+    def _scaledModelInput(self):
+        return self.__scaler.transform(self._lastReadingsBuffer.to_numpy(dtype=float))
+
+    def simulateStep(self, carbIntake=0, predictedBolus=None):
+         """Advance one 5 minute step. `predictedBolus` lets a caller pass in a batched prediction."""
             
          lastReading = self._lastReadingsBuffer.iloc[-1]
     
@@ -130,9 +183,15 @@ class AiPatient():
          absorbed_carbs = self._absorb_carbs_for_step()
 
          # model prediction
-         predictedBolus = self._predictBolusNextStep(
-              self._lastReadingsBuffer.to_numpy(dtype=float).reshape(1, 12, 6)
-         )
+         if predictedBolus is None:
+             predictedBolus = self._predictBolusNextStep(
+                  self._lastReadingsBuffer.to_numpy(dtype=float).reshape(1, 12, 6)
+             )
+
+         # The model doses for the default target; shift by the correction a different target
+         # needs and keep the delivered bolus within the pump limit
+         predictedBolus += (targetGlucose - self._targetGlucose) / self._ISF
+         predictedBolus = min(max(predictedBolus, 0.0), self._maxDosage)
     
          # update glucose
          new_glucose = self._updateGlucose(
@@ -163,9 +222,48 @@ class AiPatient():
              "bolus": predictedBolus,
              "carbs": absorbed_carbs
          }
-    
 
 
+    def getState(self):
+        """Everything that evolves between steps, plus the tunable parameters. The loaded model,
+        scaler and sensor data are not included."""
+        return {
+            "buffer": self._lastReadingsBuffer.to_numpy(dtype=float).copy(),
+            "carb_events": copy.deepcopy(self._carb_events),
+            "TDD": float(self._TDD),
+            "ICR": float(self._ICR),
+            "ISF": float(self._ISF),
+            "totalDeliveredInsulin": float(self._totalDeliveredInsulin),
+            "rng": copy.deepcopy(self._rng.bit_generator.state),
+            "parameters": self.getParameters(),
+        }
 
-    
+    def setState(self, state):
+        if "parameters" in state:
+            self.setParameters(**state["parameters"])
+        self._lastReadingsBuffer = pd.DataFrame(np.array(state["buffer"], dtype=float), columns=feature_columns)
+        self._carb_events = copy.deepcopy(state["carb_events"])
+        self._TDD = state["TDD"]
+        self._ICR = state["ICR"]
+        self._ISF = state["ISF"]
+        self._totalDeliveredInsulin = state["totalDeliveredInsulin"]
+        self._rng = np.random.default_rng()
+        self._rng.bit_generator.state = copy.deepcopy(state["rng"])
+
+    def fork(self, state=None, seed=None):
+        """Return a new patient that shares this one's model and scaler but owns its own state.
 
+        Skips the CSV read, scaler fit and model load of `__init__`, so many branches can be
+        created cheaply from one snapshot. A `seed` replaces the copied noise generator.
+        """
+        branch = AiPatient.__new__(AiPatient)
+        branch.setParameters(**self.getParameters())
+        branch._sensorData = self._sensorData
+        branch.__scaler = self.__scaler
+        branch._predictionModel = getattr(self, "_predictionModel", None)
+        branch._step_minutes = self._step_minutes
+        branch._carb_absorption_minutes = self._carb_absorption_minutes
+        branch.setState(state if state is not None else self.getState())
+        if seed is not None:
+            branch._rng = np.random.default_rng(seed)
+        return branch
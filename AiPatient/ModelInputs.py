@@ -0,0 +1,7 @@
+# Model input layout and file names, kept free of TensorFlow so the numpy-only
+# training data tooling can import them without loading the model stack
+
+feature_columns = ['glucose', 'calories', 'heart_rate', 'steps', 'basal_rate', 'carb_input']
+
+modelPath = './AiPatient/PatientData/glucose_lstm_model.h5'
+scalerFile = 'scaler.pkl'  # saved next to a retrained model (see TrainingData.retrain)
@@ -0,0 +1,201 @@
+import glob
+import hashlib
+import json
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from sklearn.preprocessing import StandardScaler
+
+from AiPatient.ModelInputs import feature_columns, scalerFile
+
+
+# Same layout as Glucose_Modeling.ipynb: 12 steps of the 6 features predict the next bolus
+target_column = 'bolus_volume_delivered'
+sequence_length = 12
+
+PATIENT_FILES_PATTERN = './AiPatient/PatientData/HUPA*.csv'
+DEFAULT_CACHE_DIR = './AiPatient/PatientData/.window_cache'
+RETRAINED_DIR = './AiPatient/PatientData/retrained'
+RETRAINED_MODEL_FILE = 'glucose_lstm_model.h5'
+CHUNK_ROWS = 50_000
+
+
+def _separator(path):
+    # The notebook reads the raw HUPA export with ';', the copies in this repo use ','
+    with open(path) as f:
+        header = f.readline()
+    return ';' if header.count(';') > header.count(',') else ','
+
+
+def readPatientChunks(path, chunkRows=CHUNK_ROWS):
+    """Yield (features, target) float arrays of at most `chunkRows` rows from one HUPA file."""
+    for chunk in pd.read_csv(path, sep=_separator(path), usecols=feature_columns + [target_column], chunksize=chunkRows):
+        yield chunk[feature_columns].to_numpy(dtype=np.float32), chunk[target_column].to_numpy(dtype=np.float32)
+
+
+def fitScaler(paths, chunkRows=CHUNK_ROWS):
+    """StandardScaler fitted over every file with partial_fit, one chunk in memory at a time."""
+    scaler = StandardScaler()
+    for path in paths:
+        for features, _ in readPatientChunks(path, chunkRows):
+            scaler.partial_fit(features)
+    return scaler
+
+
+def _fileStats(path):
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def cachedScaler(paths, cacheDir=DEFAULT_CACHE_DIR, chunkRows=CHUNK_ROWS):
+    """fitScaler() result, reused from `cacheDir` while none of the files changed."""
+    payload = {"files": [_fileStats(path) for path in paths], "chunkRows": chunkRows}
+    key = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:16]
+    scalerPath = os.path.join(cacheDir, f"scaler-{key}.pkl")
+    if os.path.exists(scalerPath):
+        with open(scalerPath, 'rb') as f:
+            return pickle.load(f)
+    scaler = fitScaler(paths, chunkRows)
+    with open(scalerPath, 'wb') as f:
+        pickle.dump(scaler, f)
+    return scaler
+
+
+def _shardKey(path, scaler, chunkRows):
+    payload = {
+        **_fileStats(path),
+        "chunkRows": chunkRows,
+        "sequence_length": sequence_length,
+        "mean": scaler.mean_.tolist(),
+        "scale": scaler.scale_.tolist(),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def buildShards(paths=None, cacheDir=DEFAULT_CACHE_DIR, scaler=None, chunkRows=CHUNK_ROWS):
+    """Scale every file chunk by chunk and cache the rows as .npy shards.
+
+    Shards hold scaled rows (not windows, which would be 12x larger). Each shard after the
+    first of a file repeats the previous chunk's last `sequence_length` rows, so every window
+    lies inside a single shard and windows never cross patient files. Files whose content and
+    scaler are unchanged reuse their cached shards, and the fitted scaler itself is cached, so a
+    fully cached run does not re-read the files. Returns (shard paths, scaler).
+    """
+    paths = sorted(paths if paths is not None else glob.glob(PATIENT_FILES_PATTERN))
+    os.makedirs(cacheDir, exist_ok=True)
+    if scaler is None:
+        scaler = cachedScaler(paths, cacheDir, chunkRows)
+
+    shards = []
+    for path in paths:
+        key = _shardKey(path, scaler, chunkRows)
+        manifest = os.path.join(cacheDir, f"{key}.json")
+        if os.path.exists(manifest):
+            with open(manifest) as f:
+                shards.extend(json.load(f))
+            continue
+
+        fileShards = []
+        carryFeatures = np.empty((0, len(feature_columns)), dtype=np.float32)
+        carryTarget = np.empty(0, dtype=np.float32)
+        for index, (features, target) in enumerate(readPatientChunks(path, chunkRows)):
+            features = np.concatenate([carryFeatures, scaler.transform(features).astype(np.float32)])
+            target = np.concatenate([carryTarget, target])
+            if len(target) > sequence_length:
+                shardPath = os.path.join(cacheDir, f"{key}-{index:05d}.npy")
+                np.save(shardPath, np.column_stack([features, target]))
+                fileShards.append(shardPath)
+            carryFeatures, carryTarget = features[-sequence_length:], target[-sequence_length:]
+        with open(manifest, 'w') as f:
+            json.dump(fileShards, f)
+        shards.extend(fileShards)
+    return shards, scaler
+
+
+def loadWindows(shardPath, validationSplit=0.0, part='train'):
+    """Zero-copy (X, y) views over one memory-mapped shard.
+
+    X[i] is rows i..i+11 of the six features and y[i] the bolus of row i+12, as in the
+    notebook's create_sequences(). The last `validationSplit` of the windows form the
+    'validation' part (unshuffled split, like train_test_split(shuffle=False)).
+    """
+    rows = np.load(shardPath, mmap_mode='r')
+    features, target = rows[:, :len(feature_columns)], rows[:, len(feature_columns)]
+    # (n, 6, 12) -> (n, 12, 6), still a view
+    X = sliding_window_view(features[:-1], sequence_length, axis=0).transpose(0, 2, 1)
+    y = target[sequence_length:]
+    split = int(len(y) * (1 - validationSplit))
+    return (X[:split], y[:split]) if part == 'train' else (X[split:], y[split:])
+
+
+def windowBatches(shards, batchSize=32, validationSplit=0.2, part='train', shuffle=False, seed=0):
+    """Yield (X, y) batches across shards; only the current batch is ever copied into memory."""
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(shards)) if shuffle else range(len(shards))
+    for shardIndex in order:
+        X, y = loadWindows(shards[shardIndex], validationSplit, part)
+        indices = rng.permutation(len(y)) if shuffle else np.arange(len(y))
+        for start in range(0, len(indices), batchSize):
+            batch = np.sort(indices[start:start + batchSize])
+            yield np.ascontiguousarray(X[batch]), np.ascontiguousarray(y[batch])
+
+
+def makeDataset(shards, batchSize=32, validationSplit=0.2, part='train', shuffle=False, seed=0):
+    """Streaming tf.data.Dataset over the shards, ready for model.fit()."""
+    import tensorflow as tf
+
+    return tf.data.Dataset.from_generator(
+        lambda: windowBatches(shards, batchSize, validationSplit, part, shuffle, seed),
+        output_signature=(
+            tf.TensorSpec(shape=(None, sequence_length, len(feature_columns)), dtype=tf.float32),
+            tf.TensorSpec(shape=(None,), dtype=tf.float32),
+        ),
+    ).prefetch(tf.data.AUTOTUNE)
+
+
+def buildModel():
+    """The LSTM architecture from Glucose_Modeling.ipynb."""
+    from tensorflow.keras.layers import LSTM, Dense, Dropout
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.optimizers import Adam
+
+    model = Sequential([
+        LSTM(64, return_sequences=True, input_shape=(sequence_length, len(feature_columns))),
+        Dropout(0.2),
+        LSTM(32, return_sequences=True),
+        Dropout(0.2),
+        LSTM(16),
+        Dropout(0.2),
+        Dense(8, activation='relu'),
+        Dense(1)
+    ])
+    model.compile(optimizer=Adam(learning_rate=0.001), loss='mse', metrics=['mae'])
+    return model
+
+
+def retrain(paths=None, outputDir=RETRAINED_DIR, epochs=50, batchSize=32, cacheDir=DEFAULT_CACHE_DIR):
+    """Retrain the glucose LSTM on every patient file in bounded memory.
+
+    The model and the scaler it was trained with are saved together in `outputDir`; the
+    bundled model is left untouched. Use it with AiPatient(modelPath=<outputDir>/glucose_lstm_model.h5).
+    """
+    shards, scaler = buildShards(paths, cacheDir)
+    model = buildModel()
+    history = model.fit(
+        makeDataset(shards, batchSize, part='train'),
+        validation_data=makeDataset(shards, batchSize, part='validation'),
+        epochs=epochs,
+        verbose=1,
+    )
+    os.makedirs(outputDir, exist_ok=True)
+    model.save(os.path.join(outputDir, RETRAINED_MODEL_FILE))
+    with open(os.path.join(outputDir, scalerFile), 'wb') as f:
+        pickle.dump(scaler, f)
+    return model, history
+
+
+if __name__ == '__main__':
+    retrain()
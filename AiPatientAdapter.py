@@ -0,0 +1,176 @@
+import time
+from typing import Any, Dict, List
+
+from AiPatient.AiPatient import AiPatient, predictBolusBatch
+from GlycemicMetrics import HYPER_THRESHOLD, HYPO_THRESHOLD
+
+
+def updateGlucoseDataBatch(adapters: List["AiPatientAdapter"], absoluteTimestamps: List[float]) -> None:
+    """updateGlucoseData() for many adapters, running one batched model call for those with a step due."""
+    due = [i for i, (adapter, ts) in enumerate(zip(adapters, absoluteTimestamps)) if adapter.stepDue(ts)]
+    boluses = predictBolusBatch([adapters[i]._ai for i in due])
+    predicted: Dict[int, float] = {i: float(bolus) for i, bolus in zip(due, boluses)}
+    for i, (adapter, ts) in enumerate(zip(adapters, absoluteTimestamps)):
+        adapter.updateGlucoseData(ts, predictedBolus=predicted.get(i))
+
+
+class AiPatientAdapter:
+    """Adapter to expose AiPatient with the same interface used by the UI.
+
+    It keeps per-frame arrays aligned with `SimulationClock.getSimulationTimestampData()`
+    by appending a value each UI tick, carrying forward last values between model steps.
+    """
+
+    STEP_SECONDS = 300  # 5 minutes per model step
+
+    def __init__(self, seed: int | None = None, ai: AiPatient | None = None) -> None:
+        self._ai = ai if ai is not None else AiPatient(seed=seed)
+        # Start time set on first external request via getSimStartTime()
+        self._sim_start_time: int | None = None
+        # Series data aligned with clock timestamps
+        self._glucose_data: List[float] = []
+        self._insulin_data: List[float] = []
+        self._carb_data: List[float] = []
+        # Latest values
+        self._latest_glucose: float = float(self._ai._lastReadingsBuffer.iloc[-1]["glucose"])  # type: ignore[attr-defined]
+        self._latest_insulin: float = 0.0
+        self._latest_carbs: float = 0.0
+        self._pending_carbs: float = 0.0
+        # Step tracking
+        self._last_step_sim_seconds: float = 0.0
+        self._new_step_occurred: bool = False
+        # Status
+        self._last_risk: str | None = None
+
+    # Interface expected by UI code
+    def getPatientType(self) -> str:
+        return "AI"
+
+    def getSimStartTime(self) -> int:
+        if self._sim_start_time is None:
+            self._sim_start_time = int(time.time())
+        return self._sim_start_time
+
+    def setSimStartTime(self, startTime: int) -> None:
+        self._sim_start_time = startTime
+
+    def getGlucoseLevelAtTimestamp(self, ts: int) -> float:
+        # Rough lookup by step index; fallback to latest known value
+        start = self.getSimStartTime()
+        if ts <= start:
+            return self._latest_glucose
+        step_index = int((ts - start) // self.STEP_SECONDS)
+        if 0 <= step_index < len(self._glucose_data):
+            return float(self._glucose_data[step_index])
+        return self._latest_glucose
+
+    def stepDue(self, absoluteTimestamp: float) -> bool:
+        """True when the next updateGlucoseData() call at this time will run a model step."""
+        sim_seconds = max(0.0, float(absoluteTimestamp - self.getSimStartTime()))
+        return bool(self._glucose_data) and (sim_seconds - self._last_step_sim_seconds) >= self.STEP_SECONDS
+
+    def updateGlucoseData(self, absoluteTimestamp: float, predictedBolus: float | None = None) -> None:
+        # Convert absolute to simulated seconds from start
+        start = self.getSimStartTime()
+        sim_seconds = max(0.0, float(absoluteTimestamp - start))
+        self._new_step_occurred = False
+
+        # First point: seed with initial glucose
+        if not self._glucose_data:
+            self._glucose_data.append(self._latest_glucose)
+            return
+
+        # Model step only every STEP_SECONDS; otherwise carry forward value
+        if (sim_seconds - self._last_step_sim_seconds) >= self.STEP_SECONDS:
+            # Apply any queued carbs at the model step
+            result = self._ai.simulateStep(carbIntake=self._pending_carbs, predictedBolus=predictedBolus)
+            self._latest_glucose = float(result["glucose"])  # type: ignore[index]
+            self._latest_insulin = float(result["bolus"])    # type: ignore[index]
+            self._latest_carbs = float(result["carbs"])      # type: ignore[index]
+            self._last_step_sim_seconds = sim_seconds
+            self._new_step_occurred = True
+            # Clear pending carbs after applying this step
+            self._pending_carbs = 0.0
+
+        self._glucose_data.append(self._latest_glucose)
+
+    def updateInsulinInjectionData(self, absoluteTimestamp: float) -> None:  # noqa: ARG002
+        # Spike insulin only on new steps; zero otherwise
+        self._insulin_data.append(self._latest_insulin if self._new_step_occurred else 0.0)
+
+    def updateCarbIntakeData(self, absoluteTimestamp: float) -> None:  # noqa: ARG002
+        self._carb_data.append(self._latest_carbs if self._new_step_occurred else 0.0)
+
+    def getLatestGlucoseReading(self) -> float:
+        return self._latest_glucose
+
+    def stepOccurred(self) -> bool:
+        return self._new_step_occurred
+
+    def getLatestInsulinIntake(self) -> float:
+        return self._latest_insulin if self._new_step_occurred else 0.0
+
+    def getLatestCarbsIntake(self) -> float:
+        return self._latest_carbs if self._new_step_occurred else 0.0
+
+    def getGlucoseData(self) -> List[float]:
+        return self._glucose_data
+
+    def getInsulinInjectionData(self) -> List[float]:
+        return self._insulin_data
+
+    def getCarbsIntakeData(self) -> List[float]:
+        return self._carb_data
+
+    def getPatientStatus(self) -> str | None:
+        # Report status only when a new model step occurred to avoid log spam
+        if not self._new_step_occurred:
+            return None
+        bg = self._latest_glucose
+        if bg < HYPO_THRESHOLD:
+            return f"Hypoglycemia risk: BG={bg:.1f} mg/dL"
+        if bg > HYPER_THRESHOLD:
+            return f"Hyperglycemia risk: BG={bg:.1f} mg/dL"
+        return None
+
+    # Extra API for UI
+    def addCarbIntake(self, grams: float) -> None:
+        self._pending_carbs += max(0.0, float(grams))
+
+    # Snapshot / fork
+    def getState(self) -> Dict[str, Any]:
+        return {
+            "ai": self._ai.getState(),
+            "sim_start_time": self._sim_start_time,
+            "glucose_data": list(self._glucose_data),
+            "insulin_data": list(self._insulin_data),
+            "carb_data": list(self._carb_data),
+            "latest_glucose": self._latest_glucose,
+            "latest_insulin": self._latest_insulin,
+            "latest_carbs": self._latest_carbs,
+            "pending_carbs": self._pending_carbs,
+            "last_step_sim_seconds": self._last_step_sim_seconds,
+            "new_step_occurred": self._new_step_occurred,
+            "last_risk": self._last_risk,
+        }
+
+    def setState(self, state: Dict[str, Any]) -> None:
+        self._ai.setState(state["ai"])
+        self._sim_start_time = state["sim_start_time"]
+        self._glucose_data = list(state["glucose_data"])
+        self._insulin_data = list(state["insulin_data"])
+        self._carb_data = list(state["carb_data"])
+        self._latest_glucose = state["latest_glucose"]
+        self._latest_insulin = state["latest_insulin"]
+        self._latest_carbs = state["latest_carbs"]
+        self._pending_carbs = state["pending_carbs"]
+        self._last_step_sim_seconds = state["last_step_sim_seconds"]
+        self._new_step_occurred = state["new_step_occurred"]
+        self._last_risk = state["last_risk"]
+
+    def fork(self, state: Dict[str, Any] | None = None) -> "AiPatientAdapter":
+        """New adapter sharing the loaded model, starting from `state` (or the current state)."""
+        state = state if state is not None else self.getState()
+        branch = AiPatientAdapter(ai=self._ai.fork(state["ai"]))
+        branch.setState(state)
+        return branch
@@ -0,0 +1,316 @@
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from GlycemicMetrics import HYPER_THRESHOLD, HYPO_THRESHOLD
+from Patient import patientTypeFile
+
+
+# ----------------------------
+# Model parameters
+# ----------------------------
+# Meal/glucose/insulin model of Dalla Man et al. (the UVA/Padova model used by simglucose,
+# which produced the traces in patientData/). Average adult values; per kg where applicable.
+BASE_PARAMETERS: Dict[str, float] = {
+    "Vg": 1.88, "k1": 0.065, "k2": 0.079,                       # glucose kinetics
+    "Vi": 0.05, "m1": 0.190, "m2": 0.484, "m4": 0.194, "m30": 0.285,  # insulin kinetics
+    "kmax": 0.0558, "kmin": 0.0080, "kabs": 0.057, "f": 0.90, "b": 0.82, "d": 0.010,  # gut
+    "kp2": 0.0021, "kp3": 0.009, "ki": 0.0079,                  # endogenous production
+    "Fsnc": 1.0, "Vm0": 2.50, "Vmx": 0.047, "Km0": 225.59, "p2u": 0.0331,  # utilization
+    "ke1": 0.0005, "ke2": 339.0,                                # renal excretion
+    "ka1": 0.0018, "ka2": 0.0182, "kd": 0.0164,                 # subcutaneous insulin
+    "ksc": 0.1,                                                 # CGM sensor delay
+}
+
+# Basal glucose (mg/dL) and basal insulin (U/min) match the first rows of patientData/*.csv
+PATIENT_TYPE_PARAMETERS: Dict[str, Dict[str, float]] = {
+    "child": {"BW": 34.55, "Gb": 151.3, "basal": 0.005667, "carbRatio": 20.0, "Vmx": 0.080},
+    "adolescent": {"BW": 68.70, "Gb": 145.9, "basal": 0.010800, "carbRatio": 12.0, "Vmx": 0.060},
+    "adult": {"BW": 102.32, "Gb": 135.6, "basal": 0.028742, "carbRatio": 10.0},
+}
+
+# Parameters that get log-normal inter-patient variability in a cohort
+VARIABLE_PARAMETERS = ("BW", "Vg", "kabs", "kmax", "kp2", "Vmx", "ka1", "ka2", "carbRatio")
+
+STATE_SIZE = 13
+STEP_MINUTES = 1.0
+PMOL_PER_UNIT = 6000.0
+
+
+def _steadyState(p: Dict[str, np.ndarray]) -> np.ndarray:
+    """Basal state for every patient, deriving kp1 so that Gb is an equilibrium under basal insulin."""
+    n = p["BW"].shape[0]
+    x = np.zeros((n, STATE_SIZE))
+
+    # Insulin: subcutaneous depots and plasma/liver insulin under constant basal infusion
+    u = p["basal"] * PMOL_PER_UNIT / p["BW"]
+    isc1 = u / (p["ka1"] + p["kd"])
+    isc2 = p["kd"] * isc1 / p["ka2"]
+    ipb = u / ((p["m2"] + p["m4"]) - p["m1"] * p["m2"] / (p["m1"] + p["m30"]))
+    ilb = p["m2"] * ipb / (p["m1"] + p["m30"])
+    ib = ipb / p["Vi"]
+
+    # Glucose: solve k1*Gp - k2*Gt = Vm0*Gt/(Km0+Gt) for the tissue compartment
+    gpb = p["Gb"] * p["Vg"]
+    a = p["k1"] * gpb
+    bq = p["k2"] * p["Km0"] + p["Vm0"] - a
+    gtb = (-bq + np.sqrt(bq ** 2 + 4 * p["k2"] * a * p["Km0"])) / (2 * p["k2"])
+    eb = np.where(gpb > p["ke2"], p["ke1"] * (gpb - p["ke2"]), 0.0)
+    egpb = p["Fsnc"] + eb + a - p["k2"] * gtb
+    p["kp1"] = egpb + p["kp2"] * gpb + p["kp3"] * ib
+    p["Ib"] = ib
+    p["u"] = u
+
+    x[:, 3] = gpb
+    x[:, 4] = gtb
+    x[:, 5] = ipb
+    x[:, 7] = ib
+    x[:, 8] = ib
+    x[:, 9] = ilb
+    x[:, 10] = isc1
+    x[:, 11] = isc2
+    x[:, 12] = gpb
+    return x
+
+
+class CompartmentalCohort:
+    """N virtual patients integrated together as one (N, 13) state array.
+
+    Each call to step() advances every patient by one minute with a fixed-step RK4 solver.
+    Carbs and boluses are applied as impulses at the start of the next step; basal insulin
+    is a constant infusion. Time only moves forward through advanceTo(), so several
+    CompartmentalPatient views can share one cohort.
+    """
+
+    def __init__(self, patients: int = 1, patientType: int = 3, seed: int | None = None, variability: float = 0.1) -> None:
+        if patientType not in patientTypeFile:
+            raise ValueError(f'{patientType} is Not a valid patient type!')
+        self._patientType = patientTypeFile[patientType]
+        self._rng = np.random.default_rng(seed)
+
+        base = {**BASE_PARAMETERS, **PATIENT_TYPE_PARAMETERS[self._patientType]}
+        self._params: Dict[str, np.ndarray] = {name: np.full(patients, value, dtype=float) for name, value in base.items()}
+        if patients > 1 and variability > 0:
+            for name in VARIABLE_PARAMETERS:
+                self._params[name] *= self._rng.lognormal(0.0, variability, patients)
+            self._params["Gb"] += self._rng.normal(0.0, 10.0, patients)
+        self._x = _steadyState(self._params)
+
+        self._dbar = np.zeros(patients)            # size of the last meal in the stomach (mg)
+        self._pendingCarbs = np.zeros(patients)    # g, applied at the next step
+        self._pendingBolus = np.zeros(patients)    # U, applied at the next step
+        self._totalInsulin = np.zeros(patients)    # U delivered since start (basal + bolus)
+        self._totalCarbs = np.zeros(patients)      # g eaten since start
+        self._minutes = 0
+        self._history: np.ndarray | None = None    # (N, historyMinutes) ring buffer of BG, see enableHistory()
+        self.simStartTime = int(time.time())
+
+    def __len__(self) -> int:
+        return self._x.shape[0]
+
+    def getPatientType(self) -> str:
+        return self._patientType
+
+    # Inputs
+    def addCarbs(self, grams: float, index: int | None = None, withBolus: bool = True) -> None:
+        """Queue a meal for one patient (or all when index is None), by default with a carb-ratio bolus."""
+        target = slice(None) if index is None else index
+        self._pendingCarbs[target] += grams
+        if withBolus:
+            self._pendingBolus[target] += grams / self._params["carbRatio"][target]
+
+    def addBolus(self, units: float, index: int | None = None) -> None:
+        self._pendingBolus[slice(None) if index is None else index] += units
+
+    # Outputs
+    def getGlucose(self) -> np.ndarray:
+        return self._x[:, 3] / self._params["Vg"]
+
+    def getCGM(self) -> np.ndarray:
+        return self._x[:, 12] / self._params["Vg"]
+
+    def getTotalInsulin(self) -> np.ndarray:
+        return self._totalInsulin
+
+    def getTotalCarbs(self) -> np.ndarray:
+        return self._totalCarbs
+
+    def getSimulatedMinutes(self) -> int:
+        return self._minutes
+
+    def enableHistory(self, minutes: int) -> None:
+        """Keep the last `minutes` BG values of every patient in one shared ring buffer."""
+        self._history = np.repeat(self.getGlucose()[:, None], minutes, axis=1)
+
+    def getHistory(self, index: int) -> np.ndarray:
+        """BG of one patient over the history window, oldest first."""
+        row = self._history[index]
+        pos = self._minutes % row.shape[0]
+        return np.concatenate((row[pos:], row[:pos]))
+
+    # Dynamics
+    def _derivatives(self, x: np.ndarray) -> np.ndarray:
+        p = self._params
+        qsto1, qsto2, qgut, gp, gt, ip, xins, i1, idel, il, isc1, isc2, gs = x.T
+        dxdt = np.empty_like(x)
+
+        qsto = qsto1 + qsto2
+        dbar = np.where(self._dbar > 0, self._dbar, 1.0)
+        aa = 5 / 2 / (1 - p["b"]) / dbar
+        cc = 5 / 2 / p["d"] / dbar
+        kgut = np.where(
+            self._dbar > 0,
+            p["kmin"] + (p["kmax"] - p["kmin"]) / 2
+            * (np.tanh(aa * (qsto - p["b"] * dbar)) - np.tanh(cc * (qsto - p["d"] * dbar)) + 2),
+            p["kmax"],
+        )
+        dxdt[:, 0] = -p["kmax"] * qsto1
+        dxdt[:, 1] = p["kmax"] * qsto1 - kgut * qsto2
+        dxdt[:, 2] = kgut * qsto2 - p["kabs"] * qgut
+
+        ra = p["f"] * p["kabs"] * qgut / p["BW"]
+        egp = np.maximum(p["kp1"] - p["kp2"] * gp - p["kp3"] * idel, 0.0)
+        et = np.where(gp > p["ke2"], p["ke1"] * (gp - p["ke2"]), 0.0)
+        dxdt[:, 3] = egp + ra - p["Fsnc"] - et - p["k1"] * gp + p["k2"] * gt
+
+        uid = (p["Vm0"] + p["Vmx"] * xins) * gt / (p["Km0"] + gt)
+        dxdt[:, 4] = -uid + p["k1"] * gp - p["k2"] * gt
+
+        dxdt[:, 5] = -(p["m2"] + p["m4"]) * ip + p["m1"] * il + p["ka1"] * isc1 + p["ka2"] * isc2
+        it = ip / p["Vi"]
+        dxdt[:, 6] = -p["p2u"] * xins + p["p2u"] * (it - p["Ib"])
+        dxdt[:, 7] = -p["ki"] * (i1 - it)
+        dxdt[:, 8] = -p["ki"] * (idel - i1)
+        dxdt[:, 9] = -(p["m1"] + p["m30"]) * il + p["m2"] * ip
+        dxdt[:, 10] = p["u"] - (p["ka1"] + p["kd"]) * isc1
+        dxdt[:, 11] = p["kd"] * isc1 - p["ka2"] * isc2
+        dxdt[:, 12] = -p["ksc"] * gs + p["ksc"] * gp
+        return dxdt
+
+    def step(self) -> None:
+        """Advance all patients by STEP_MINUTES."""
+        meal = self._pendingCarbs > 0
+        if meal.any():
+            self._x[meal, 0] += self._pendingCarbs[meal] * 1000.0
+            self._dbar[meal] = self._x[meal, 0] + self._x[meal, 1]
+        bolus = self._pendingBolus > 0
+        if bolus.any():
+            self._x[bolus, 10] += self._pendingBolus[bolus] * PMOL_PER_UNIT / self._params["BW"][bolus]
+
+        h = STEP_MINUTES
+        x = self._x
+        k1 = self._derivatives(x)
+        k2 = self._derivatives(x + h / 2 * k1)
+        k3 = self._derivatives(x + h / 2 * k2)
+        k4 = self._derivatives(x + h * k3)
+        self._x = np.maximum(x + h / 6 * (k1 + 2 * k2 + 2 * k3 + k4), 0.0)
+
+        self._totalInsulin += self._params["basal"] * h + self._pendingBolus
+        self._totalCarbs += self._pendingCarbs
+        self._pendingCarbs[:] = 0.0
+        self._pendingBolus[:] = 0.0
+        if self._history is not None:
+            self._history[:, self._minutes % self._history.shape[1]] = self.getGlucose()
+        self._minutes += 1
+
+    def advanceTo(self, simSeconds: float) -> int:
+        """Step until `simSeconds` of simulated time are covered; returns the number of steps taken."""
+        target = int(simSeconds // (STEP_MINUTES * 60))
+        steps = 0
+        while self._minutes < target:
+            self.step()
+            steps += 1
+        return steps
+
+
+class CompartmentalPatient:
+    """One patient of a CompartmentalCohort behind the interface `run_simulation` expects.
+
+    Series are appended once per UI tick like AiPatientAdapter; insulin and carbs report
+    what was delivered since the previous tick.
+    """
+
+    def __init__(self, patientType: int = 3, cohort: CompartmentalCohort | None = None, index: int = 0) -> None:
+        self._cohort = cohort if cohort is not None else CompartmentalCohort(1, patientType)
+        self._index = index
+        self._glucose_data: List[float] = []
+        self._insulin_data: List[float] = []
+        self._carb_data: List[float] = []
+        self._latest_glucose = float(self._cohort.getGlucose()[index])
+        self._latest_insulin = 0.0
+        self._latest_carbs = 0.0
+        self._seen_insulin = 0.0
+        self._seen_carbs = 0.0
+        self._seen_minutes = self._cohort.getSimulatedMinutes()
+        self._stepped = False
+        self._patientState: str | None = None
+
+    def getPatientType(self) -> str:
+        return f"Compartmental {self._cohort.getPatientType()}"
+
+    def getSimStartTime(self) -> int:
+        return self._cohort.simStartTime
+
+    def setSimStartTime(self, startTime: int) -> None:
+        self._cohort.simStartTime = startTime
+
+    def getGlucoseLevelAtTimestamp(self, timestamp: float) -> float:  # noqa: ARG002
+        # The model is simulated forward only; there is no precomputed trace to look up
+        return self._latest_glucose
+
+    def updateGlucoseData(self, absoluteTimestamp: float) -> None:
+        self._cohort.advanceTo(max(0.0, absoluteTimestamp - self.getSimStartTime()))
+        totalInsulin = float(self._cohort.getTotalInsulin()[self._index])
+        totalCarbs = float(self._cohort.getTotalCarbs()[self._index])
+        self._latest_glucose = float(self._cohort.getGlucose()[self._index])
+        self._latest_insulin = totalInsulin - self._seen_insulin
+        self._latest_carbs = totalCarbs - self._seen_carbs
+        self._seen_insulin = totalInsulin
+        self._seen_carbs = totalCarbs
+        self._stepped = self._cohort.getSimulatedMinutes() != self._seen_minutes
+        self._seen_minutes = self._cohort.getSimulatedMinutes()
+        self._glucose_data.append(self._latest_glucose)
+
+    def updateInsulinInjectionData(self, absoluteTimestamp: float) -> None:  # noqa: ARG002
+        self._insulin_data.append(self._latest_insulin)
+
+    def updateCarbIntakeData(self, absoluteTimestamp: float) -> None:  # noqa: ARG002
+        self._carb_data.append(self._latest_carbs)
+
+    def getGlucoseData(self) -> List[float]:
+        return self._glucose_data
+
+    def getInsulinInjectionData(self) -> List[float]:
+        return self._insulin_data
+
+    def getCarbsIntakeData(self) -> List[float]:
+        return self._carb_data
+
+    def getLatestGlucoseReading(self) -> float:
+        return self._latest_glucose
+
+    def getLatestInsulinIntake(self) -> float:
+        return self._latest_insulin
+
+    def stepOccurred(self) -> bool:
+        return self._stepped
+
+    def getLatestCarbsIntake(self) -> float:
+        return self._latest_carbs
+
+    def getPatientStatus(self) -> str | None:
+        # Only report transitions, otherwise the log gets the same message every tick
+        bg = self._latest_glucose
+        if bg < HYPO_THRESHOLD:
+            state = f"Hypoglycemia risk: BG={bg:.1f} mg/dL"
+        elif bg > HYPER_THRESHOLD:
+            state = f"Hyperglycemia risk: BG={bg:.1f} mg/dL"
+        else:
+            state = None
+        changed = (state is None) != (self._patientState is None)
+        self._patientState = state
+        return state if changed else None
+
+    def addCarbIntake(self, grams: float) -> None:
+        self._cohort.addCarbs(max(0.0, float(grams)), index=self._index)
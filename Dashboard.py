@@ -0,0 +1,166 @@
+import time
+from typing import List
+
+import dearpygui.dearpygui as dpg
+
+from CompartmentalPatient import CompartmentalCohort
+from GlycemicMetrics import HYPER_THRESHOLD, HYPO_THRESHOLD
+from SimulationClock import SIM_BASE_RATE, SimulationClock
+
+
+# ----------------------------
+# Constants
+# ----------------------------
+TILE_COLUMNS = 4
+TILE_ROWS = 3
+TILE_WIDTH = 450
+TILE_HEIGHT = 260
+HISTORY_MINUTES = 360  # 6 hours of BG per tile
+
+RISK_STYLES = {
+    "hypo": ("Hypoglycemia", [255, 0, 0, 255]),
+    "hyper": ("Hyperglycemia", [255, 140, 0, 255]),
+    "normal": ("Normal", [0, 255, 0, 255]),
+}
+
+
+def risk_category(bg: float) -> str:
+    if bg < HYPO_THRESHOLD:
+        return "hypo"
+    if bg > HYPER_THRESHOLD:
+        return "hyper"
+    return "normal"
+
+
+# ----------------------------
+# Tiles
+# ----------------------------
+class Tile:
+    """One reusable grid cell. Tiles are a fixed pool bound to whichever patients are on screen,
+    so the number of Dear PyGui items never grows with the cohort size."""
+
+    def __init__(self, history_x: List[float]) -> None:
+        self.patient_index: int | None = None
+        self.risk: str | None = None
+        self.drawn_minute = -1
+        with dpg.child_window(width=TILE_WIDTH, height=TILE_HEIGHT, border=True, no_scrollbar=True) as self.window:
+            with dpg.group(horizontal=True):
+                self.title = dpg.add_text("")
+                self.badge = dpg.add_text("")
+            with dpg.plot(height=-1, width=-1, no_menus=True, no_box_select=True, no_mouse_pos=True):
+                x_axis = dpg.add_plot_axis(dpg.mvXAxis, label="Minutes")
+                dpg.set_axis_limits(x_axis, history_x[0], history_x[-1])
+                self.y_axis = dpg.add_plot_axis(dpg.mvYAxis, label="mg/dL")
+                dpg.set_axis_limits(self.y_axis, 40, 400)
+                self.series = dpg.add_line_series(history_x, [0.0] * len(history_x), parent=self.y_axis)
+
+    def bind(self, patient_index: int | None) -> None:
+        if patient_index == self.patient_index:
+            return
+        self.patient_index = patient_index
+        self.risk = None
+        self.drawn_minute = -1
+        dpg.configure_item(self.window, show=patient_index is not None)
+        if patient_index is not None:
+            dpg.set_value(self.title, f"Patient #{patient_index}")
+
+    def redraw(self, cohort: CompartmentalCohort, history_x: List[float]) -> None:
+        # Nothing changes between model minutes, so skip the upload entirely
+        minute = cohort.getSimulatedMinutes()
+        if self.patient_index is None or minute == self.drawn_minute:
+            return
+        self.drawn_minute = minute
+
+        history = cohort.getHistory(self.patient_index)
+        dpg.set_value(self.series, [history_x, history.tolist()])
+
+        risk = risk_category(float(history[-1]))
+        if risk != self.risk:
+            self.risk = risk
+            text, color = RISK_STYLES[risk]
+            dpg.set_value(self.badge, text)
+            dpg.configure_item(self.badge, color=color)
+
+
+class CohortDashboard:
+    """Grid of the visible part of a cohort. The whole cohort is simulated every frame (one
+    vectorized step), but only the TILE_ROWS x TILE_COLUMNS visible tiles touch the UI."""
+
+    def __init__(self, cohort: CompartmentalCohort, sim_clock: SimulationClock) -> None:
+        self.cohort = cohort
+        self.sim_clock = sim_clock
+        self.first_row = 0
+        self.total_rows = -(-len(cohort) // TILE_COLUMNS)
+        self.history_x = [float(m) for m in range(-HISTORY_MINUTES + 1, 1)]
+        self.tiles: List[Tile] = []
+        cohort.enableHistory(HISTORY_MINUTES)
+
+    def build(self) -> None:
+        with dpg.window(tag="dashboard-root", no_title_bar=True, no_move=True, no_collapse=True, no_close=True):
+            with dpg.group(horizontal=True):
+                dpg.add_text(f"Cohort: {len(self.cohort)} {self.cohort.getPatientType()} patients")
+                dpg.add_text("", tag="dashboard-time")
+                dpg.add_text("", tag="dashboard-summary")
+            with dpg.group(horizontal=True):
+                for rate in (1, 3, 6):
+                    dpg.add_button(label=f"{rate}x", callback=lambda s, a, u: self.sim_clock.setSimulationRate(u * SIM_BASE_RATE), user_data=rate)
+                dpg.add_button(label="60 g meal for everyone", callback=lambda: self.cohort.addCarbs(60.0))
+                dpg.add_slider_int(
+                    label="First row",
+                    tag="dashboard-row",
+                    min_value=0,
+                    max_value=max(0, self.total_rows - TILE_ROWS),
+                    width=300,
+                    callback=lambda s, a: self.scroll_to(a),
+                )
+            for _ in range(TILE_ROWS):
+                with dpg.group(horizontal=True):
+                    for _ in range(TILE_COLUMNS):
+                        self.tiles.append(Tile(self.history_x))
+
+        with dpg.handler_registry():
+            dpg.add_mouse_wheel_handler(callback=lambda s, a: self.scroll_to(self.first_row - int(a)))
+        self.scroll_to(0)
+
+    def scroll_to(self, first_row: int) -> None:
+        self.first_row = min(max(0, first_row), max(0, self.total_rows - TILE_ROWS))
+        dpg.set_value("dashboard-row", self.first_row)
+        for slot, tile in enumerate(self.tiles):
+            index = self.first_row * TILE_COLUMNS + slot
+            tile.bind(index if index < len(self.cohort) else None)
+
+    def update(self) -> None:
+        self.sim_clock.updateClock()
+        sim_seconds = self.sim_clock.getSimulationTime()
+        minute_before = self.cohort.getSimulatedMinutes()
+        self.cohort.advanceTo(sim_seconds)
+
+        if self.cohort.getSimulatedMinutes() != minute_before:
+            glucose = self.cohort.getGlucose()
+            hypo = int((glucose < HYPO_THRESHOLD).sum())
+            hyper = int((glucose > HYPER_THRESHOLD).sum())
+            dpg.set_value("dashboard-summary", f"| hypo: {hypo}  hyper: {hyper}")
+            dpg.set_value("dashboard-time", f"| sim time {sim_seconds / 3600:.1f} h ({self.sim_clock.getSimulationRate() / SIM_BASE_RATE:g}x)")
+
+        for tile in self.tiles:
+            tile.redraw(self.cohort, self.history_x)
+
+
+def run_dashboard(cohort: CompartmentalCohort, sim_clock: SimulationClock) -> None:
+    dpg.create_context()
+    dpg.create_viewport(title="Cohort Dashboard", width=TILE_COLUMNS * (TILE_WIDTH + 10) + 40, height=TILE_ROWS * (TILE_HEIGHT + 10) + 120)
+
+    dashboard = CohortDashboard(cohort, sim_clock)
+    dashboard.build()
+    dpg.set_primary_window("dashboard-root", True)
+
+    dpg.setup_dearpygui()
+    dpg.show_viewport()
+
+    try:
+        while dpg.is_dearpygui_running():
+            time.sleep(0.02)
+            dashboard.update()
+            dpg.render_dearpygui_frame()
+    finally:
+        dpg.destroy_context()
@@ -0,0 +1,29 @@
+from typing import Dict, Sequence
+
+import numpy as np
+
+
+HYPO_THRESHOLD = 70
+HYPER_THRESHOLD = 180
+
+
+def glycemicMetrics(glucose: Sequence[float], insulin: Sequence[float] | None = None) -> Dict[str, float]:
+    bg = np.asarray(glucose, dtype=float)
+    # Kovatchev risk transform, same as the LBGI/HBGI columns of the simglucose traces
+    f = 1.509 * (np.log(np.maximum(bg, 1.0)) ** 1.084 - 5.381)
+    risk = 10 * f ** 2
+    mean = float(bg.mean())
+    sd = float(bg.std())
+    return {
+        "mean_bg": mean,
+        "sd_bg": sd,
+        "cv_bg": sd / mean if mean else 0.0,
+        "min_bg": float(bg.min()),
+        "max_bg": float(bg.max()),
+        "time_in_range": float(np.mean((bg >= HYPO_THRESHOLD) & (bg <= HYPER_THRESHOLD))),
+        "time_below_range": float(np.mean(bg < HYPO_THRESHOLD)),
+        "time_above_range": float(np.mean(bg > HYPER_THRESHOLD)),
+        "lbgi": float(np.mean(np.where(f < 0, risk, 0.0))),
+        "hbgi": float(np.mean(np.where(f > 0, risk, 0.0))),
+        "total_insulin": float(np.sum(insulin)) if insulin is not None else 0.0,
+    }
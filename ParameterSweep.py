@@ -0,0 +1,178 @@
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+import pandas as pd
+
+from GlycemicMetrics import glycemicMetrics
+
+
+MODEL_PATH = './AiPatient/PatientData/glucose_lstm_model.h5'
+SENSOR_DATA_PATH = './AiPatient/PatientData/HUPA0002P.csv'  # seeds the buffer and fits the scaler
+DEFAULT_CACHE_DIR = './.sweep_cache'
+SWEEP_VERSION = 2  # bump when the simulation code changes in a way that invalidates cached results
+MAX_BATCH_POINTS = 256  # runs stepped together in one worker task
+
+# Parameters accepted by AiPatient.setParameters()
+SWEEP_PARAMETERS = ('bodyWeight', 'tddPerKg', 'DIA', 'maxDosage', 'targetGlucose', 'carb_factor')
+
+
+# ----------------------------
+# Sampling
+# ----------------------------
+def parameterGrid(**axes: Sequence[Any]) -> List[Dict[str, Any]]:
+    """Cartesian product of the given axes, e.g. parameterGrid(DIA=[180, 240], carb_factor=[1.0, 1.5])."""
+    _checkParameterNames(axes)
+    names = sorted(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(axes[name] for name in names))]
+
+
+def randomSample(ranges: Dict[str, Tuple[float, float]], samples: int, seed: int = 0) -> List[Dict[str, float]]:
+    """`samples` points drawn uniformly from {name: (low, high)}."""
+    _checkParameterNames(ranges)
+    rng = random.Random(seed)
+    return [{name: rng.uniform(low, high) for name, (low, high) in sorted(ranges.items())} for _ in range(samples)]
+
+
+def _plain(value: Any) -> Any:
+    # numpy scalars (e.g. from np.arange) -> int/float, so points and seeds serialize to JSON
+    return value.item() if hasattr(value, 'item') else value
+
+
+def _checkParameterNames(names: Iterable[str]) -> None:
+    unknown = set(names) - set(SWEEP_PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters {sorted(unknown)}, expected a subset of {SWEEP_PARAMETERS}")
+
+
+# ----------------------------
+# Cache
+# ----------------------------
+def fileHash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cacheKey(
+    parameters: Dict[str, Any], seed: int, steps: int, meals: Dict[int, float], modelDigest: str, dataDigest: str
+) -> str:
+    payload = {
+        "version": SWEEP_VERSION,
+        "parameters": parameters,
+        "seed": seed,
+        "steps": steps,
+        "meals": sorted(meals.items()),
+        "model": modelDigest,
+        "data": dataDigest,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+# ----------------------------
+# Workers
+# ----------------------------
+_workerTemplate = None
+
+
+def _initWorker() -> None:
+    # One model load per worker process; every point is a fork of this patient
+    global _workerTemplate
+    from AiPatient.AiPatient import AiPatient
+    _workerTemplate = AiPatient()
+
+
+def simulatePoints(
+    runs: List[Tuple[Dict[str, Any], int]], steps: int, meals: Dict[int, float]
+) -> List[Dict[str, float]]:
+    """Step several (parameters, seed) runs side by side with one batched model call per step."""
+    from AiPatient.AiPatient import predictBolusBatch
+
+    if _workerTemplate is None:
+        _initWorker()
+    patients = []
+    for parameters, seed in runs:
+        patient = _workerTemplate.fork(seed=seed)
+        patient.setParameters(**parameters)
+        patients.append(patient)
+
+    glucose = [[] for _ in runs]
+    insulin = [[] for _ in runs]
+    for step in range(steps):
+        carbIntake = meals.get(step, 0)
+        for run, (patient, bolus) in enumerate(zip(patients, predictBolusBatch(patients))):
+            result = patient.simulateStep(carbIntake=carbIntake, predictedBolus=bolus)
+            glucose[run].append(float(result["glucose"]))
+            insulin[run].append(float(result["bolus"]))
+    return [glycemicMetrics(g, i) for g, i in zip(glucose, insulin)]
+
+
+def simulatePoint(parameters: Dict[str, Any], seed: int, steps: int, meals: Dict[int, float]) -> Dict[str, float]:
+    return simulatePoints([(parameters, seed)], steps, meals)[0]
+
+
+# ----------------------------
+# Sweep
+# ----------------------------
+def runSweep(
+    points: List[Dict[str, Any]],
+    seeds: Sequence[int] = (0,),
+    steps: int = 288,
+    meals: Dict[int, float] | None = None,
+    workers: int | None = None,
+    cacheDir: str = DEFAULT_CACHE_DIR,
+) -> pd.DataFrame:
+    """Simulate every (point, seed) combination and return one row of metrics per run.
+
+    `steps` are 5 minute model steps (288 = one day) and `meals` maps a step index to grams
+    of carbs. Results are cached in `cacheDir` keyed by parameters, seed, meals and the
+    model and sensor data file hashes, so re-running or extending a sweep only simulates
+    the new points. Each worker task steps up to MAX_BATCH_POINTS runs together.
+    """
+    points = [{name: _plain(value) for name, value in parameters.items()} for parameters in points]
+    seeds = [_plain(seed) for seed in seeds]
+    meals = {_plain(step): _plain(grams) for step, grams in (meals or {}).items()}
+    os.makedirs(cacheDir, exist_ok=True)
+    modelDigest, dataDigest = fileHash(MODEL_PATH), fileHash(SENSOR_DATA_PATH)
+
+    rows: List[Dict[str, Any] | None] = []
+    pending: List[Tuple[int, str, Dict[str, Any], int]] = []
+    for parameters in points:
+        _checkParameterNames(parameters)
+        for seed in seeds:
+            key = cacheKey(parameters, seed, steps, meals, modelDigest, dataDigest)
+            cachePath = os.path.join(cacheDir, f"{key}.json")
+            if os.path.exists(cachePath):
+                with open(cachePath) as f:
+                    rows.append(json.load(f))
+            else:
+                pending.append((len(rows), cachePath, parameters, seed))
+                rows.append(None)
+
+    if pending:
+        print(f"Sweep: {len(rows) - len(pending)} cached, {len(pending)} to simulate")
+        # spawn: TensorFlow does not survive a fork() of an initialised parent
+        context = multiprocessing.get_context('spawn')
+        workers = workers or os.cpu_count() or 1
+        batchSize = min(MAX_BATCH_POINTS, -(-len(pending) // workers))
+        batches = [pending[start:start + batchSize] for start in range(0, len(pending), batchSize)]
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_initWorker) as pool:
+            futures = [
+                (batch, pool.submit(simulatePoints, [(parameters, seed) for _, _, parameters, seed in batch], steps, meals))
+                for batch in batches
+            ]
+            for batch, future in futures:
+                for (index, cachePath, parameters, seed), metrics in zip(batch, future.result()):
+                    row = {**parameters, "seed": seed, **metrics}
+                    with open(cachePath, 'w') as f:
+                        json.dump(row, f)
+                    rows[index] = row
+
+    return pd.DataFrame(rows)
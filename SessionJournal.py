@@ -0,0 +1,168 @@
+import argparse
+import json
+import os
+import time
+from typing import Any, Dict, List
+
+
+SESSIONS_PATH = './sessions'
+JOURNAL_VERSION = 2
+CHECKPOINT_SECONDS = 3600  # sim seconds between checkpoints when tick times do not affect the trajectory
+
+# Modes whose model steps happen on the first tick past a step boundary, so every step needs its tick time
+STEP_CHECKPOINT_MODES = {"ai"}
+
+# Patient logic as numbered in main.get_user_config()
+PATIENT_LOGIC_MODES = {1: "ai", 2: "replay", 3: "compartmental", 5: "stream"}
+
+
+class SessionJournal:
+    """Compact record of everything that makes an interactive session non-reproducible.
+
+    One JSON object per line, in the order things happened:
+        {"e": "session", "mode": "ai", "patientType": -1, "seed": 123, "start": 1760000000, "v": 2}
+        {"e": "carbs", "t": 812.4, "g": 60.0}      carb entry at sim time t (seconds)
+        {"e": "rate", "t": 900.1, "r": 6}         simulation rate change
+        {"e": "x", "t": 1200.3, "g": "0x1.2p+7"}  checkpoint
+
+    AI sessions checkpoint every model step, because a step runs on whichever tick first
+    passes the 5 minute boundary. The other modes depend only on sim time and the input
+    events, so they checkpoint once per CHECKPOINT_SECONDS just to allow verification.
+    Checkpoints carry the glucose as a hex float so a replay can be verified bit for bit.
+    `start` is the live patient's getSimStartTime(); replay reuses it so step boundaries
+    fall on the same absolute times. "stream" sessions also store the trace path as `trace`.
+    Wall-clock tick times only matter at checkpoints, so ticks in between are not stored.
+    """
+
+    def __init__(
+        self, path: str, mode: str, patientType: int, seed: int | None, startTime: int, tracePath: str | None = None
+    ) -> None:
+        self.path = path
+        # Line buffered so a crash loses at most the event being written
+        self._file = open(path, 'w', buffering=1)
+        self._stepCheckpoints = mode in STEP_CHECKPOINT_MODES
+        self._lastCheckpoint: float | None = None
+        self._lastRate: float | None = None
+        header = {"e": "session", "mode": mode, "patientType": patientType, "seed": seed, "start": startTime, "v": JOURNAL_VERSION}
+        if tracePath is not None:
+            header["trace"] = os.path.abspath(tracePath)
+        self._write(header)
+
+    @classmethod
+    def create(
+        cls, mode: str, patientType: int, seed: int | None, startTime: int, tracePath: str | None = None
+    ) -> "SessionJournal":
+        os.makedirs(SESSIONS_PATH, exist_ok=True)
+        path = os.path.join(SESSIONS_PATH, time.strftime('session-%Y%m%d-%H%M%S.jsonl'))
+        return cls(path, mode, patientType, seed, startTime, tracePath)
+
+    def _write(self, event: Dict[str, Any]) -> None:
+        self._file.write(json.dumps(event, separators=(',', ':')) + '\n')
+
+    def recordCarbs(self, simSeconds: float, grams: float) -> None:
+        self._write({"e": "carbs", "t": simSeconds, "g": grams})
+
+    def recordTick(self, simSeconds: float, patient, simRate: float) -> None:
+        """Call once per UI tick after the patient was updated."""
+        if simRate != self._lastRate:
+            self._lastRate = simRate
+            self._write({"e": "rate", "t": simSeconds, "r": simRate})
+
+        if self._stepCheckpoints:
+            due = patient.stepOccurred()
+        else:
+            due = self._lastCheckpoint is None or simSeconds - self._lastCheckpoint >= CHECKPOINT_SECONDS
+        if due:
+            self._lastCheckpoint = simSeconds
+            glucose = float(patient.getLatestGlucoseReading())
+            self._write({"e": "x", "t": simSeconds, "g": glucose.hex()})
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def loadJournal(path: str) -> List[Dict[str, Any]]:
+    with open(path) as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    if not events or events[0].get("e") != "session":
+        raise ValueError(f"{path} is not a session journal")
+    if events[0].get("v") != JOURNAL_VERSION:
+        raise ValueError(f"Unsupported journal version {events[0].get('v')} in {path}")
+    return events
+
+
+def createPatient(mode: str, patientType: int, seed: int | None, startTime: int | None = None, tracePath: str | None = None):
+    """Patient for a journal mode. `startTime` pins the start of the modes that otherwise start
+    at the current wall-clock time; a replayed trace always starts at its first row.
+    "stream" replays the simglucose CSV at `tracePath` without loading it into memory."""
+    if mode == "ai":
+        from AiPatientAdapter import AiPatientAdapter
+        patient = AiPatientAdapter(seed=seed)
+    elif mode == "compartmental":
+        from CompartmentalPatient import CompartmentalPatient
+        patient = CompartmentalPatient(patientType)
+    elif mode == "stream":
+        from TraceReplay import StreamingPatient
+        return StreamingPatient(path=tracePath)
+    else:
+        from Patient import Patient
+        return Patient(patientType)
+    if startTime is not None:
+        patient.setSimStartTime(startTime)
+    return patient
+
+
+def replaySession(path: str, verify: bool = False) -> Dict[str, Any]:
+    """Re-run a recorded session headless, as fast as the patient model allows.
+
+    With `verify`, every checkpoint glucose must match the recording exactly; the first
+    divergence raises an AssertionError naming the sim time.
+    """
+    events = loadJournal(path)
+    header = events[0]
+    patient = createPatient(header["mode"], header["patientType"], header["seed"], header["start"], header.get("trace"))
+    start = patient.getSimStartTime()
+
+    trajectory = []
+    began = time.perf_counter()
+    for event in events[1:]:
+        if event["e"] == "carbs":
+            # The live tick at this sim time already ran; bring the patient up to it first
+            patient.updateGlucoseData(absoluteTimestamp=start + event["t"])
+            patient.addCarbIntake(event["g"])
+        elif event["e"] == "x":
+            patient.updateGlucoseData(absoluteTimestamp=start + event["t"])
+            patient.updateInsulinInjectionData(absoluteTimestamp=start + event["t"])
+            glucose = float(patient.getLatestGlucoseReading())
+            if verify and glucose.hex() != event["g"]:
+                raise AssertionError(
+                    f"Replay diverged at sim time {event['t']:.1f}s: recorded {float.fromhex(event['g'])}, got {glucose}"
+                )
+            trajectory.append((event["t"], glucose))
+    if hasattr(patient, "close"):
+        patient.close()
+
+    return {
+        "mode": header["mode"],
+        "checkpoints": len(trajectory),
+        "simulatedSeconds": trajectory[-1][0] if trajectory else 0.0,
+        "wallSeconds": time.perf_counter() - began,
+        "trajectory": trajectory,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay a recorded simulation session headless")
+    parser.add_argument("journal")
+    parser.add_argument("--verify", action="store_true", help="fail on the first checkpoint that is not bit-exact")
+    args = parser.parse_args()
+
+    result = replaySession(args.journal, verify=args.verify)
+    print(
+        f"Replayed {result['checkpoints']} checkpoints ({result['simulatedSeconds'] / 3600:.1f} sim hours) "
+        f"in {result['wallSeconds']:.2f}s" + (" - verified bit-exact" if args.verify else "")
+    )
+
+
+if __name__ == "__main__":
+    main()
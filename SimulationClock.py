@@ -1,25 +1,33 @@
 import time
 from datetime import datetime, timedelta
 
-SIM_BASE_RATE = 1
+# Sim seconds per real second at "Normal Speed" (10 sim minutes per second, a 5-day trace in
+# about 12 minutes). UI rates like 3x and 6x are multiples of this base.
+SIM_BASE_RATE = 600
 
 class SimulationClock:
     def __init__(self, startTimestamp: int):
         self._simulationStartTime = startTimestamp
         self._realStartTime = time.time()
+        self._lastRealTime = self._realStartTime
         self._currentSimulationTime = startTimestamp
         self._isRunning = False
         self._timestampData = []
-        self._simulationRate = 1.0
+        self._simulationRate = SIM_BASE_RATE
+        self._paused = False
     
 
-     # When changing time rate the value appended is multiplied before appending....so at time second 2 at 4x speed it becomes 8 but when you decrease after 1 second 3*1x speed  becomes 3 second so we travel back in time
-     # Congrats we Traveled back in time
+    # Advance by the real time since the previous tick only, so the sim speed does not depend
+    # on how often the UI ticks and a rate change never moves time backwards
     def updateClock(self):
+        if self._paused:
+            return
         if not self._isRunning:
             self._isRunning = True
         
-        elapsedTimeRealtime = time.time() - self._realStartTime 
+        now = time.time()
+        elapsedTimeRealtime = now - self._lastRealTime
+        self._lastRealTime = now
         last_timestamp = self._timestampData[-1] if self._timestampData else 0
         self._currentSimulationTime = last_timestamp + (elapsedTimeRealtime*self._simulationRate)
         self._timestampData.append(self._currentSimulationTime)
@@ -28,6 +36,14 @@ class SimulationClock:
         self._simulationRate=simRate
         print(f"set sim rate to {self._simulationRate}")
         
+    # Real time spent paused is not simulated
+    def setPaused(self, paused: bool):
+        self._paused = paused
+        self._lastRealTime = time.time()
+
+    def isPaused(self):
+        return self._paused
+
     def setIsRunningState(self, state: bool):
         self._isRunning = state
     
@@ -38,4 +54,22 @@ class SimulationClock:
         return self._timestampData
     
     def getSimulationRate(self):
-        return self._simulationRate 
\ No newline at end of file
+        return self._simulationRate
+
+    def getState(self):
+        return {
+            "simulationStartTime": self._simulationStartTime,
+            "realElapsedTime": time.time() - self._realStartTime,
+            "currentSimulationTime": self._currentSimulationTime,
+            "timestampData": list(self._timestampData),
+            "simulationRate": self._simulationRate,
+        }
+
+    def setState(self, state):
+        self._simulationStartTime = state["simulationStartTime"]
+        self._realStartTime = time.time() - state["realElapsedTime"]
+        # Real time spent before the restore is not simulated
+        self._lastRealTime = time.time()
+        self._currentSimulationTime = state["currentSimulationTime"]
+        self._timestampData = list(state["timestampData"])
+        self._simulationRate = state["simulationRate"]
@@ -0,0 +1,349 @@
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import secrets
+from collections import deque
+from typing import Any, Dict, List, Set
+
+from AiPatient.AiPatient import AiPatient
+from AiPatientAdapter import AiPatientAdapter, updateGlucoseDataBatch
+from Patient import Patient
+from SimulationClock import SIM_BASE_RATE, SimulationClock
+
+
+# ----------------------------
+# Constants
+# ----------------------------
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+TICK_SECONDS = 0.1
+CLIENT_QUEUE_SIZE = 256  # messages buffered per client before the oldest ones are dropped
+SERVER_HISTORY = 1  # samples kept per series; clients only ever get the latest values
+MAX_RATE = 100  # in multiples of SIM_BASE_RATE; faster runs past the end of the replay traces in seconds
+MAX_CARBS_GRAMS = 500
+
+
+# ----------------------------
+# Sessions
+# ----------------------------
+class SimulationSession:
+    """One patient + clock, driven by the server tick instead of the Dear PyGui loop.
+
+    Control messages are queued and applied at the start of the next tick, so the tick
+    (which runs in a worker thread) never races with the event loop.
+    """
+
+    def __init__(self, sessionId: int, patient, mode: str) -> None:
+        self.sessionId = sessionId
+        self.patient = patient
+        self.mode = mode
+        self.simClock = SimulationClock(patient.getSimStartTime())
+        self.subscribers: Set["ClientConnection"] = set()
+        self._controls: deque = deque()
+        self._lastSent: tuple | None = None
+
+    def queueCarbIntake(self, grams: float) -> None:
+        self._controls.append(("carbs", grams))
+
+    def queueSimulationRate(self, rate: float) -> None:
+        self._controls.append(("rate", rate))
+
+    def applyControls(self) -> None:
+        while self._controls:
+            op, value = self._controls.popleft()
+            if op == "carbs":
+                self.patient.addCarbIntake(value)
+            elif op == "rate":
+                self.simClock.setSimulationRate(value)
+
+    def absoluteTime(self) -> float:
+        return self.simClock.getSimulationTime() + self.simClock._simulationStartTime
+
+    def updateSeries(self, absoluteTime: float) -> None:
+        self.patient.updateInsulinInjectionData(absoluteTimestamp=absoluteTime)
+        self.patient.updateCarbIntakeData(absoluteTimestamp=absoluteTime)
+
+    def trimHistory(self) -> None:
+        """Drop series samples nobody reads, so a session's memory does not grow with uptime."""
+        series = [
+            self.simClock.getSimulationTimestampData(),
+            self.patient.getGlucoseData(),
+            self.patient.getInsulinInjectionData(),
+            self.patient.getCarbsIntakeData(),
+        ]
+        for values in series:
+            del values[:-SERVER_HISTORY]
+
+    def _latest(self) -> tuple:
+        return (
+            float(self.patient.getLatestGlucoseReading()),
+            float(self.patient.getLatestInsulinIntake()),
+            float(self.patient.getLatestCarbsIntake()),
+        )
+
+    def snapshot(self) -> Dict[str, Any] | None:
+        """Current values, or None before the first tick."""
+        if not self.patient.getGlucoseData():
+            return None
+        return self._message(self._latest())
+
+    def delta(self) -> Dict[str, Any] | None:
+        """Latest values if they changed since the last broadcast, else None."""
+        current = self._latest()
+        if current == self._lastSent:
+            return None
+        self._lastSent = current
+        return self._message(current)
+
+    def _message(self, values: tuple) -> Dict[str, Any]:
+        glucose, insulin, carbs = values
+        return {
+            "op": "step",
+            "session": self.sessionId,
+            "t": self.simClock.getSimulationTime(),
+            "rate": self.simClock.getSimulationRate() / SIM_BASE_RATE,
+            "glucose": glucose,
+            "insulin": insulin,
+            "carbs": carbs,
+        }
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "session": self.sessionId,
+            "mode": self.mode,
+            "patientType": self.patient.getPatientType(),
+            "rate": self.simClock.getSimulationRate() / SIM_BASE_RATE,
+            "subscribers": len(self.subscribers),
+        }
+
+
+def tickSessions(sessions: List[SimulationSession]) -> Dict[int, Exception]:
+    """Advance every session by one tick, batching model inference across AI sessions.
+
+    A session that raises (or ends up with a non-finite value) is left out of the rest of the
+    tick and returned as {sessionId: error}; the other sessions are unaffected.
+    """
+    failures: Dict[int, Exception] = {}
+    for session in sessions:
+        try:
+            session.applyControls()
+            session.simClock.updateClock()
+        except Exception as e:
+            failures[session.sessionId] = e
+
+    aiSessions = [s for s in sessions if s.mode == "ai" and s.sessionId not in failures]
+    try:
+        updateGlucoseDataBatch([s.patient for s in aiSessions], [s.absoluteTime() for s in aiSessions])
+    except Exception:
+        # Step them one at a time instead so only the failing session is dropped
+        for session in aiSessions:
+            try:
+                session.patient.updateGlucoseData(absoluteTimestamp=session.absoluteTime())
+            except Exception as e:
+                failures[session.sessionId] = e
+
+    for session in sessions:
+        if session.sessionId in failures:
+            continue
+        try:
+            absoluteTime = session.absoluteTime()
+            if session.mode != "ai":
+                session.patient.updateGlucoseData(absoluteTimestamp=absoluteTime)
+            session.updateSeries(absoluteTime)
+            session.trimHistory()
+            if not all(math.isfinite(value) for value in session._latest()):
+                raise ValueError("Session produced a non-finite value")
+        except Exception as e:
+            failures[session.sessionId] = e
+    return failures
+
+
+# ----------------------------
+# Clients
+# ----------------------------
+class ClientConnection:
+    """A connected client with a bounded outgoing queue.
+
+    A slow reader never blocks the tick loop: when its queue is full the oldest pending
+    message is dropped (and counted) so the client always catches up to the latest state.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        self.dropped = 0
+
+    def send(self, message: Dict[str, Any]) -> None:
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+    async def writeLoop(self) -> None:
+        while True:
+            message = await self.queue.get()
+            if self.dropped:
+                message = dict(message, dropped=self.dropped)
+                self.dropped = 0
+            try:
+                line = json.dumps(message, allow_nan=False)
+            except ValueError:
+                line = json.dumps({"op": "error", "session": message.get("session"), "message": "Non-finite value dropped"})
+            self.writer.write((line + "\n").encode())
+            await self.writer.drain()
+
+
+# ----------------------------
+# Server
+# ----------------------------
+class SimulationServer:
+    """Hosts independent patient sessions over a newline-delimited JSON TCP protocol.
+
+    Requests (one JSON object per line):
+        {"op": "create", "mode": "ai"}                      -> {"op": "created", "session": id}
+        {"op": "create", "mode": "replay", "patientType": 3}
+        {"op": "subscribe" | "unsubscribe" | "close", "session": id}
+        {"op": "carbs", "session": id, "grams": 60}
+        {"op": "rate", "session": id, "rate": 6}            (multiples of SIM_BASE_RATE, like the UI)
+        {"op": "list"}
+    Subscribers receive the current {"op": "step", ...} on subscribe, then one each time
+    a session's values change.
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> None:
+        self.host = host
+        self.port = port
+        self.sessions: Dict[int, SimulationSession] = {}
+        self._ids = itertools.count(1)
+        # Loaded once; AI sessions are forked from it so they share one model
+        self._aiTemplate: AiPatient | None = None
+
+    def createSession(self, mode: str = "ai", patientType: int = 3, seed: int | None = None) -> SimulationSession:
+        if mode == "ai":
+            if self._aiTemplate is None:
+                self._aiTemplate = AiPatient()
+            # Fresh seed per session, otherwise every fork would replay the template's noise
+            patient = AiPatientAdapter(ai=self._aiTemplate.fork(seed=seed if seed is not None else secrets.randbits(64)))
+        elif mode == "replay":
+            patient = Patient(patientType)
+        else:
+            raise ValueError(f"{mode} is Not a valid session mode!")
+        session = SimulationSession(next(self._ids), patient, mode)
+        self.sessions[session.sessionId] = session
+        return session
+
+    async def _tickLoop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(TICK_SECONDS)
+            sessions = list(self.sessions.values())
+            if not sessions:
+                continue
+            try:
+                failures = await loop.run_in_executor(None, tickSessions, sessions)
+            except Exception as e:
+                print(f"Tick failed: {e!r}")
+                continue
+            for sessionId, error in failures.items():
+                self._closeFailedSession(sessionId, error)
+            for session in sessions:
+                if session.sessionId in failures or not session.subscribers:
+                    continue
+                delta = session.delta()
+                if delta is not None:
+                    for client in session.subscribers:
+                        client.send(delta)
+
+    def _closeFailedSession(self, sessionId: int, error: Exception) -> None:
+        session = self.sessions.pop(sessionId, None)
+        if session is None:
+            return
+        print(f"Session {sessionId} failed and was closed: {error!r}")
+        for client in session.subscribers:
+            client.send({"op": "error", "session": sessionId, "message": f"Session failed: {error}"})
+            client.send({"op": "closed", "session": sessionId})
+
+    def _session(self, request: Dict[str, Any]) -> SimulationSession:
+        sessionId = int(request["session"])
+        if sessionId not in self.sessions:
+            raise KeyError(f"Unknown session {sessionId}")
+        return self.sessions[sessionId]
+
+    def _handleRequest(self, client: ClientConnection, request: Dict[str, Any]) -> Dict[str, Any] | None:
+        op = request.get("op")
+        if op == "create":
+            session = self.createSession(request.get("mode", "ai"), int(request.get("patientType", 3)), request.get("seed"))
+            return {"op": "created", "session": session.sessionId}
+        if op == "list":
+            return {"op": "sessions", "sessions": [s.describe() for s in self.sessions.values()]}
+        if op == "subscribe":
+            session = self._session(request)
+            session.subscribers.add(client)
+            # The shared delta only fires on the next change; start the new client off with the current state
+            return session.snapshot()
+        if op == "unsubscribe":
+            self._session(request).subscribers.discard(client)
+            return None
+        if op == "carbs":
+            session = self._session(request)
+            if not hasattr(session.patient, "addCarbIntake"):
+                raise ValueError("Carb entry is available only in AI patient mode")
+            grams = float(request["grams"])
+            if not (math.isfinite(grams) and 0 <= grams <= MAX_CARBS_GRAMS):
+                raise ValueError(f"grams must be between 0 and {MAX_CARBS_GRAMS}")
+            session.queueCarbIntake(grams)
+            return None
+        if op == "rate":
+            session = self._session(request)
+            rate = float(request["rate"])
+            if not (math.isfinite(rate) and 0 < rate <= MAX_RATE):
+                raise ValueError(f"rate must be greater than 0 and at most {MAX_RATE}")
+            session.queueSimulationRate(rate * SIM_BASE_RATE)
+            return None
+        if op == "close":
+            self.sessions.pop(self._session(request).sessionId)
+            return {"op": "closed", "session": int(request["session"])}
+        raise ValueError(f"Unknown op {op!r}")
+
+    async def _handleClient(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        client = ClientConnection(reader, writer)
+        writerTask = asyncio.create_task(client.writeLoop())
+        try:
+            while line := await reader.readline():
+                try:
+                    reply = self._handleRequest(client, json.loads(line))
+                except Exception as e:
+                    reply = {"op": "error", "message": str(e)}
+                if reply is not None:
+                    client.send(reply)
+        except ConnectionError:
+            pass
+        finally:
+            for session in self.sessions.values():
+                session.subscribers.discard(client)
+            writerTask.cancel()
+            writer.close()
+
+    async def serve(self) -> None:
+        # Load the model off the event loop before accepting clients, so the first AI
+        # create does not stall every connection
+        self._aiTemplate = await asyncio.get_running_loop().run_in_executor(None, AiPatient)
+        server = await asyncio.start_server(self._handleClient, self.host, self.port)
+        print(f"Simulation server listening on {self.host}:{self.port}")
+        async with server:
+            await asyncio.gather(server.serve_forever(), self._tickLoop())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run headless simulation sessions over TCP")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    asyncio.run(SimulationServer(args.host, args.port).serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import pickle
+from typing import Any, Dict, List, Tuple
+
+from SimulationClock import SimulationClock
+
+
+SNAPSHOT_VERSION = 1
+
+
+class SimulationSnapshot:
+    """Serializable state of a running simulation (patient + clock).
+
+    A snapshot holds plain Python/NumPy data only, so it pickles quickly and can be
+    restored into the running objects or forked into independent branches that share
+    the already loaded prediction model:
+
+        snap = SimulationSnapshot.capture(patient, sim_clock)
+        snap.save("hour10.snap")
+        for branch, clock in SimulationSnapshot.load("hour10.snap").fork(patient, branches=3):
+            branch.addCarbIntake(60)
+            ...  # drive branch.updateGlucoseData() from here on, the shared prefix is not recomputed
+    """
+
+    def __init__(self, patientState: Dict[str, Any], clockState: Dict[str, Any] | None = None) -> None:
+        self.patientState = patientState
+        self.clockState = clockState
+
+    @classmethod
+    def capture(cls, patient, simClock: SimulationClock | None = None) -> "SimulationSnapshot":
+        return cls(
+            patientState=patient.getState(),
+            clockState=simClock.getState() if simClock is not None else None,
+        )
+
+    def restore(self, patient, simClock: SimulationClock | None = None) -> None:
+        patient.setState(self.patientState)
+        if simClock is not None and self.clockState is not None:
+            simClock.setState(self.clockState)
+
+    def fork(self, patient, branches: int = 1) -> List[Tuple[Any, SimulationClock | None]]:
+        """Create `branches` independent (patient, clock) pairs starting at this snapshot.
+
+        `patient` is only used as the source of the loaded model; its own state is untouched.
+        """
+        forks = []
+        for _ in range(branches):
+            branch = patient.fork(self.patientState)
+            clock = None
+            if self.clockState is not None:
+                clock = SimulationClock(self.clockState["simulationStartTime"])
+                clock.setState(self.clockState)
+            forks.append((branch, clock))
+        return forks
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as f:
+            pickle.dump(
+                {"version": SNAPSHOT_VERSION, "patient": self.patientState, "clock": self.clockState},
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "SimulationSnapshot":
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        if data.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {data.get('version')} in {path}")
+        return cls(patientState=data["patient"], clockState=data["clock"])
@@ -0,0 +1,145 @@
+import io
+import os
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from Patient import PATIENT_FILES_PATH, Patient, patientTypeFile
+
+
+INDEX_STRIDE = 4096   # rows per chunk; one index entry per chunk
+WINDOW_CHUNKS = 3     # chunks kept in memory around the current sim time
+INDEX_SUFFIX = '.tidx.npz'
+
+
+class TraceReplaySource:
+    """Nearest-row lookup over a simglucose CSV trace without loading it into memory.
+
+    On first open the file is scanned once to build a sparse index (time of every
+    INDEX_STRIDE-th row -> byte offset), which is cached next to the trace when possible.
+    Lookups load only the chunk around the requested time, keep a small window of recent
+    chunks and prefetch the next one on a background thread, so memory stays constant
+    regardless of trace length.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        with open(path, 'rb') as f:
+            self._columns = f.readline().decode().strip().split(',')
+        self._indexTimes, self._indexOffsets, self._fileSize = self._loadIndex()
+        self._chunks: OrderedDict[int, Future] = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='trace-prefetch')
+
+    # Index
+    def _loadIndex(self):
+        stat = os.stat(self._path)
+        indexPath = self._path + INDEX_SUFFIX
+        if os.path.exists(indexPath):
+            cached = np.load(indexPath)
+            if int(cached['size']) == stat.st_size and float(cached['mtime']) == stat.st_mtime:
+                return cached['times'], cached['offsets'], stat.st_size
+
+        times, offsets = self._buildIndex()
+        try:
+            np.savez(indexPath, times=times, offsets=offsets, size=stat.st_size, mtime=stat.st_mtime)
+        except OSError:
+            pass  # read-only location, rebuild on next open
+        return times, offsets, stat.st_size
+
+    def _buildIndex(self):
+        times, offsets = [], []
+        with open(self._path, 'rb') as f:
+            offset = len(f.readline())
+            for row, line in enumerate(f):
+                if row % INDEX_STRIDE == 0 and line.strip():
+                    timeField = line.split(b',', 1)[0].decode()
+                    times.append(pd.Timestamp(timeField).value)
+                    offsets.append(offset)
+                offset += len(line)
+        return np.array(times, dtype=np.int64), np.array(offsets, dtype=np.int64)
+
+    # Chunks
+    def _readChunk(self, chunk: int) -> pd.DataFrame:
+        start = int(self._indexOffsets[chunk])
+        end = int(self._indexOffsets[chunk + 1]) if chunk + 1 < len(self._indexOffsets) else self._fileSize
+        with open(self._path, 'rb') as f:
+            f.seek(start)
+            data = f.read(end - start)
+        frame = pd.read_csv(io.BytesIO(data), header=None, names=self._columns)
+        frame['Time'] = pd.to_datetime(frame['Time'])
+        return frame
+
+    def _chunkFuture(self, chunk: int) -> Future:
+        if chunk in self._chunks:
+            self._chunks.move_to_end(chunk)
+        else:
+            self._chunks[chunk] = self._executor.submit(self._readChunk, chunk)
+            while len(self._chunks) > WINDOW_CHUNKS:
+                self._chunks.popitem(last=False)
+        return self._chunks[chunk]
+
+    def _getChunk(self, chunk: int) -> pd.DataFrame:
+        frame = self._chunkFuture(chunk).result()
+        # Sim time moves forward, so read the following chunk ahead of time
+        if chunk + 1 < len(self._indexOffsets):
+            self._chunkFuture(chunk + 1)
+            self._chunks.move_to_end(chunk)
+        return frame
+
+    # Lookups
+    def getStartTime(self) -> pd.Timestamp:
+        return pd.Timestamp(int(self._indexTimes[0]))
+
+    def getRowAtNearestTimestamp(self, targetTimeStamp) -> pd.Series:
+        target = pd.Timestamp(targetTimeStamp).value
+        chunk = min(max(bisect_right(self._indexTimes, target) - 1, 0), len(self._indexTimes) - 1)
+        frame = self._getChunk(chunk)
+
+        times = frame['Time'].to_numpy(dtype='datetime64[ns]').astype(np.int64)
+        idx = int(np.abs(times - target).argmin())
+        # The first row of the next chunk may be closer than anything in this one
+        if chunk + 1 < len(self._indexTimes) and abs(int(self._indexTimes[chunk + 1]) - target) < abs(int(times[idx]) - target):
+            return self._getChunk(chunk + 1).iloc[0]
+        return frame.iloc[idx]
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class StreamingPatient(Patient):
+    """Patient that replays a trace through TraceReplaySource instead of a full DataFrame."""
+
+    def __init__(self, patientType=3, path: str | None = None):
+        if path is None:
+            if patientType not in patientTypeFile:
+                raise ValueError(f'{patientType} is Not a valid patient type!')
+            path = f'{PATIENT_FILES_PATH}/{patientTypeFile[patientType]}.csv'
+            self._patientType = patientTypeFile[patientType]
+        else:
+            self._patientType = os.path.splitext(os.path.basename(path))[0]
+
+        self._traceSource = TraceReplaySource(path)
+
+        self._glucoseLevelData = []
+        self._carbsLevelData = []
+        self._insulinInjectioData = []
+        self._patientState = None
+
+    def getSimStartTime(self):
+        date = self._traceSource.getStartTime().tz_localize('UTC')
+        return int(date.timestamp())
+
+    def _getRowAtNearestTimestamp(self, timestamp):
+        # Same timestamp handling as Patient so both replay a trace identically
+        if isinstance(timestamp, (pd.Timestamp, datetime)):
+            targetTimeStamp = timestamp
+        else:
+            targetTimeStamp = datetime.fromtimestamp(timestamp)
+        return self._traceSource.getRowAtNearestTimestamp(targetTimeStamp)
+
+    def close(self) -> None:
+        self._traceSource.close()
@@ -1,4 +1,7 @@
+import argparse
+import secrets
 import time
+from collections import deque
 from typing import Dict, List, Tuple
 
 import keyboard
@@ -7,16 +10,22 @@ from threading import Timer
 import dearpygui.dearpygui as dpg
 
 from AiPatient.AiPatient import AiPatient
+from CompartmentalPatient import CompartmentalCohort
+from Dashboard import run_dashboard
+from GlycemicMetrics import HYPER_THRESHOLD, HYPO_THRESHOLD
 from Patient import Patient
-from SimulationClock import SimulationClock
+from SessionJournal import PATIENT_LOGIC_MODES, SessionJournal, createPatient
+from SimulationClock import SIM_BASE_RATE, SimulationClock
 from shapes import Circle, PhoneShape, Rectangle, ShapeConnection
 
 
 # ----------------------------
 # Constants and Utilities
 # ----------------------------
-HYPO_THRESHOLD = 70
-HYPER_THRESHOLD = 180
+ACTIVE_FRAME_SECONDS = 0.02
+IDLE_FRAME_SECONDS = 0.25
+SERIES_REFRESH_SECONDS = 1.0
+PLOT_HISTORY_POINTS = 2000  # points kept per plotted series
 
 
 def log_msg(message: str) -> None:
@@ -42,7 +51,14 @@ def cancel_carb_modal(sender, app_data, user_data) -> None:  # noqa: ARG001
     dpg.configure_item("carb-modal", show=False)
 
 
-def confirm_carb_intake(sender, app_data, patient) -> None:  # user_data = patient
+def toggle_pause(sender, app_data, user_data) -> None:  # user_data = sim_clock
+    sim_clock = user_data
+    sim_clock.setPaused(not sim_clock.isPaused())
+    dpg.configure_item(sender, label="Resume" if sim_clock.isPaused() else "Pause")
+
+
+def confirm_carb_intake(sender, app_data, user_data) -> None:  # user_data = (patient, sim_clock, journal)
+    patient, sim_clock, journal = user_data
     try:
         grams_val = dpg.get_value("carb-input")
         grams = float(grams_val) if grams_val is not None else 0.0
@@ -55,9 +71,11 @@ def confirm_carb_intake(sender, app_data, patient) -> None:  # user_data = patie
 
     if hasattr(patient, "addCarbIntake"):
         patient.addCarbIntake(grams)  # type: ignore[attr-defined]
+        if journal is not None:
+            journal.recordCarbs(sim_clock.getSimulationTime(), grams)
         log_msg(f"Queued carb intake: {grams:.0f} g for next model step")
     else:
-        log_msg("Carb entry is available only in AI patient mode")
+        log_msg("Carb entry is available only in AI and compartmental patient modes")
 
     dpg.set_value("carb-input", 0.0)
     dpg.configure_item("carb-modal", show=False)
@@ -77,120 +95,71 @@ def ai_patient_loop() -> None:
         print(f"{result}\n============\n")
 
 
-class AiPatientAdapter:
-    """Adapter to expose AiPatient with the same interface used by the UI.
-
-    It keeps per-frame arrays aligned with `SimulationClock.getSimulationTimestampData()`
-    by appending a value each UI tick, carrying forward last values between model steps.
-    """
-
-    STEP_SECONDS = 300  # 5 minutes per model step
-
-    def __init__(self) -> None:
-        self._ai = AiPatient()
-        # Start time set on first external request via getSimStartTime()
-        self._sim_start_time: int | None = None
-        # Series data aligned with clock timestamps
-        self._glucose_data: List[float] = []
-        self._insulin_data: List[float] = []
-        self._carb_data: List[float] = []
-        # Latest values
-        self._latest_glucose: float = float(self._ai._lastReadingsBuffer.iloc[-1]["glucose"])  # type: ignore[attr-defined]
-        self._latest_insulin: float = 0.0
-        self._latest_carbs: float = 0.0
-        self._pending_carbs: float = 0.0
-        # Step tracking
-        self._last_step_sim_seconds: float = 0.0
-        self._new_step_occurred: bool = False
-        # Status
-        self._last_risk: str | None = None
-
-    # Interface expected by UI code
-    def getPatientType(self) -> str:
-        return "AI"
-
-    def getSimStartTime(self) -> int:
-        if self._sim_start_time is None:
-            self._sim_start_time = int(time.time())
-        return self._sim_start_time
-
-    def getGlucoseLevelAtTimestamp(self, ts: int) -> float:
-        # Rough lookup by step index; fallback to latest known value
-        start = self.getSimStartTime()
-        if ts <= start:
-            return self._latest_glucose
-        step_index = int((ts - start) // self.STEP_SECONDS)
-        if 0 <= step_index < len(self._glucose_data):
-            return float(self._glucose_data[step_index])
-        return self._latest_glucose
-
-    def updateGlucoseData(self, absoluteTimestamp: float) -> None:
-        # Convert absolute to simulated seconds from start
-        start = self.getSimStartTime()
-        sim_seconds = max(0.0, float(absoluteTimestamp - start))
-        self._new_step_occurred = False
-
-        # First point: seed with initial glucose
-        if not self._glucose_data:
-            self._glucose_data.append(self._latest_glucose)
-            return
-
-        # Model step only every STEP_SECONDS; otherwise carry forward value
-        if (sim_seconds - self._last_step_sim_seconds) >= self.STEP_SECONDS:
-            # Apply any queued carbs at the model step
-            result = self._ai.simulateStep(carbIntake=self._pending_carbs)
-            self._latest_glucose = float(result["glucose"])  # type: ignore[index]
-            self._latest_insulin = float(result["bolus"])    # type: ignore[index]
-            self._latest_carbs = float(result["carbs"])      # type: ignore[index]
-            self._last_step_sim_seconds = sim_seconds
-            self._new_step_occurred = True
-            # Clear pending carbs after applying this step
-            self._pending_carbs = 0.0
-
-        self._glucose_data.append(self._latest_glucose)
-
-    def updateInsulinInjectionData(self, absoluteTimestamp: float) -> None:  # noqa: ARG002
-        # Spike insulin only on new steps; zero otherwise
-        self._insulin_data.append(self._latest_insulin if self._new_step_occurred else 0.0)
-
-    def updateCarbIntakeData(self, absoluteTimestamp: float) -> None:  # noqa: ARG002
-        self._carb_data.append(self._latest_carbs if self._new_step_occurred else 0.0)
-
-    def getLatestGlucoseReading(self) -> float:
-        return self._latest_glucose
-
-    def getLatestInsulinIntake(self) -> float:
-        return self._latest_insulin if self._new_step_occurred else 0.0
-
-    def getGlucoseData(self) -> List[float]:
-        return self._glucose_data
-
-    def getInsulinInjectionData(self) -> List[float]:
-        return self._insulin_data
-
-    def getPatientStatus(self) -> str | None:
-        # Report status only when a new model step occurred to avoid log spam
-        if not self._new_step_occurred:
-            return None
-        bg = self._latest_glucose
-        if bg < HYPO_THRESHOLD:
-            return f"Hypoglycemia risk: BG={bg:.1f} mg/dL"
-        if bg > HYPER_THRESHOLD:
-            return f"Hyperglycemia risk: BG={bg:.1f} mg/dL"
-        return None
-
-    # Extra API for UI
-    def addCarbIntake(self, grams: float) -> None:
-        self._pending_carbs += max(0.0, float(grams))
-
-
 # ----------------------------
 # UI Construction
 # ----------------------------
 class UIHandles:
+    """Item tags plus the last values pushed to them, so unchanged items are not re-sent to Dear PyGui."""
+
     def __init__(self, elements: Dict[str, str], shapes: Dict[str, object]) -> None:
         self.elements = elements
         self.shapes = shapes
+        self.mcu_reset_timer: Timer | None = None
+        self._pushed: Dict[str, object] = {}
+        self._series: Dict[str, Tuple[deque, deque]] = {}
+        self._series_pushed_at: Dict[str, float] = {}
+        self._dirty = False
+        self._input_activity = False
+
+    def set_value(self, name: str, value: object) -> None:
+        if self._pushed.get(name) == value:
+            return
+        self._pushed[name] = value
+        dpg.set_value(self.elements[name], value)
+
+    def configure(self, name: str, **kwargs: object) -> None:
+        key = f"{name}:config"
+        if self._pushed.get(key) == kwargs:
+            return
+        self._pushed[key] = kwargs
+        dpg.configure_item(self.elements[name], **kwargs)
+
+    def set_series(self, name: str, x_axis: str, y_axis: str, x: float, y: float) -> None:
+        # Only value changes are plotted (as steps), so the upload is bounded by PLOT_HISTORY_POINTS
+        # instead of growing with every tick. Flat stretches are re-sent every SERIES_REFRESH_SECONDS
+        # so the line keeps extending along the time axis.
+        xs, ys = self._series.setdefault(name, (deque(maxlen=PLOT_HISTORY_POINTS), deque(maxlen=PLOT_HISTORY_POINTS)))
+        now = time.monotonic()
+        changed = not ys or y != ys[-1]
+        if changed:
+            if ys:
+                # Hold the previous value up to now
+                xs.append(x)
+                ys.append(ys[-1])
+            xs.append(x)
+            ys.append(y)
+        elif now - self._series_pushed_at.get(name, 0.0) < SERIES_REFRESH_SECONDS:
+            return
+        self._series_pushed_at[name] = now
+        dpg.set_value(self.elements[name], [[*xs, x], [*ys, y]])
+        dpg.fit_axis_data(self.elements[x_axis])
+        dpg.fit_axis_data(self.elements[y_axis])
+        self._dirty = self._dirty or changed
+
+    def mark_dirty(self) -> None:
+        self._dirty = True
+
+    def mark_input_activity(self) -> None:
+        self._input_activity = True
+
+    def take_activity(self) -> bool:
+        """True if patient data changed or the user interacted since the last call.
+
+        Label writes (e.g. the sim-time text) do not count; the loop wakes up for those separately.
+        """
+        active = self._dirty or self._input_activity
+        self._dirty = self._input_activity = False
+        return active
 
 
 def create_ui(patient: Patient, sim_clock: SimulationClock) -> UIHandles:
@@ -227,9 +196,10 @@ def create_ui(patient: Patient, sim_clock: SimulationClock) -> UIHandles:
                         elements["sim-rate-txt1"] = "sim-rate-txt1"
 
                         with dpg.group(horizontal=True):
-                            dpg.add_button(label="Normal Speed", callback=lambda: sim_clock.setSimulationRate(1))
-                            dpg.add_button(label="3X Simulation Speed", callback=lambda: sim_clock.setSimulationRate(3))
-                            dpg.add_button(label="6X Simulation Speed", callback=lambda: sim_clock.setSimulationRate(6))
+                            dpg.add_button(label="Normal Speed", callback=lambda: sim_clock.setSimulationRate(SIM_BASE_RATE))
+                            dpg.add_button(label="3X Simulation Speed", callback=lambda: sim_clock.setSimulationRate(3 * SIM_BASE_RATE))
+                            dpg.add_button(label="6X Simulation Speed", callback=lambda: sim_clock.setSimulationRate(6 * SIM_BASE_RATE))
+                            dpg.add_button(label="Pause", callback=toggle_pause, user_data=sim_clock)
                             dpg.add_spacer(width=8)
                             dpg.add_button(label="Add Carb Intake", callback=open_carb_modal)
 
@@ -332,7 +302,7 @@ def create_ui(patient: Patient, sim_clock: SimulationClock) -> UIHandles:
     return UIHandles(elements=elements, shapes=shapes)
 
 
-def _build_carb_modal(patient: Patient) -> None:
+def _build_carb_modal(patient: Patient, sim_clock: SimulationClock, journal: SessionJournal | None) -> None:
     # Hidden modal created at root for reuse
     if dpg.does_item_exist("carb-modal"):
         return
@@ -340,7 +310,7 @@ def _build_carb_modal(patient: Patient) -> None:
         dpg.add_text("Enter carbs (grams):")
         dpg.add_input_float(tag="carb-input", default_value=0.0, min_value=0.0, min_clamped=True, step=1.0, format="%.0f")
         with dpg.group(horizontal=True):
-            dpg.add_button(label="Confirm", callback=confirm_carb_intake, user_data=patient)
+            dpg.add_button(label="Confirm", callback=confirm_carb_intake, user_data=(patient, sim_clock, journal))
             dpg.add_button(label="Cancel", callback=cancel_carb_modal)
 
 
@@ -357,51 +327,57 @@ def update_plots_and_labels(ui: UIHandles, sim_clock: SimulationClock, patient:
     bg = int(patient.getLatestGlucoseReading())
     insulin_dose = int(patient.getLatestInsulinIntake())
 
-    dpg.set_value(ui.elements["series_tag"], [sim_clock.getSimulationTimestampData(), patient.getGlucoseData()])
-    dpg.fit_axis_data(ui.elements["x_axis"]) 
-    dpg.fit_axis_data(ui.elements["y_axis"]) 
-
-    dpg.set_value(ui.elements["ins-series_tag"], [sim_clock.getSimulationTimestampData(), patient.getInsulinInjectionData()])
-    dpg.fit_axis_data(ui.elements["ins-x_axis"]) 
-    dpg.fit_axis_data(ui.elements["ins-y_axis"]) 
+    ui.set_series("series_tag", "x_axis", "y_axis", timestamp, float(patient.getLatestGlucoseReading()))
+    ui.set_series("ins-series_tag", "ins-x_axis", "ins-y_axis", timestamp, float(patient.getLatestInsulinIntake()))
 
     ddhhmm = seconds_to_ddhhmm(timestamp)
-    dpg.set_value(ui.elements["sim-time"], f"Simulation Time: Day: {ddhhmm[0]}, Hour: {ddhhmm[1]}, Minutes: {ddhhmm[2]}")
-    dpg.set_value(ui.elements["sim-pt-glucose"], f"Current Glucose Level  {bg} mg/dL")
-    dpg.set_value(ui.elements["sim-rate-txt1"], f"simulation rate: {sim_clock.getSimulationRate()}x ")
+    ui.set_value("sim-time", f"Simulation Time: Day: {ddhhmm[0]}, Hour: {ddhhmm[1]}, Minutes: {ddhhmm[2]}")
+    ui.set_value("sim-pt-glucose", f"Current Glucose Level  {bg} mg/dL")
+    ui.set_value("sim-rate-txt1", f"simulation rate: {sim_clock.getSimulationRate() / SIM_BASE_RATE:g}x ")
 
     risk_color = [255, 0, 0, 255] if bg > HYPER_THRESHOLD or bg < HYPO_THRESHOLD else [0, 255, 0, 255]
     risk_text = "Hyperglycemia" if bg > HYPER_THRESHOLD else ("hypoglycemia " if bg < HYPO_THRESHOLD else "Normal")
-    dpg.set_value(ui.elements["sim-pt-risk"], risk_text)
-    dpg.configure_item(ui.elements["sim-pt-risk"], color=risk_color)
+    ui.set_value("sim-pt-risk", risk_text)
+    ui.configure("sim-pt-risk", color=risk_color)
 
     return bg, insulin_dose
 
 
 def apply_visual_state(ui: UIHandles, bg: int, insulin_dose: int) -> None:
-    cgm = ui.shapes["cgm"]
-    mcu = ui.shapes["mcu"]
-    phone = ui.shapes["phone"]
+    # Resolve the final color of each shape first so a shape is configured at most once per frame
+    colors: Dict[str, Tuple[int, int, int, int]] = {}
 
     # BG-based state
     if bg < HYPO_THRESHOLD:
-        mcu.updateShapeColor((0, 120, 0, 255))
-        phone.updateShapeColor((255, 0, 0, 255))
+        colors["mcu"] = (0, 120, 0, 255)
+        colors["phone"] = (255, 0, 0, 255)
     elif bg > HYPER_THRESHOLD:
-        cgm.updateShapeColor((255, 0, 0, 255))
-        phone.updateShapeColor((255, 0, 0, 255))
+        colors["cgm"] = (255, 0, 0, 255)
+        colors["phone"] = (255, 0, 0, 255)
     else:
-        cgm.updateShapeColor((255, 255, 255, 255))
-        mcu.updateShapeColor((255, 255, 255, 255))
-        phone.updateShapeColor((190, 190, 190, 255))
+        colors["cgm"] = (255, 255, 255, 255)
+        colors["mcu"] = (255, 255, 255, 255)
+        colors["phone"] = (190, 190, 190, 255)
 
     # Insulin-based state
     if insulin_dose > 0.1:
-        mcu.updateShapeColor((0, 255, 0, 255))
-        phone.updateShapeColor((68, 225, 255, 255))
-    else:
-        t = Timer(interval=2, function=mcu.updateShapeColor, args=((255, 255, 255, 255),))
-        t.start()
+        colors["mcu"] = (0, 255, 0, 255)
+        colors["phone"] = (68, 225, 255, 255)
+    elif ui.mcu_reset_timer is None or not ui.mcu_reset_timer.is_alive():
+        ui.mcu_reset_timer = Timer(interval=2, function=ui.shapes["mcu"].updateShapeColor, args=((255, 255, 255, 255),))
+        ui.mcu_reset_timer.start()
+
+    for name, color in colors.items():
+        if ui.shapes[name].updateShapeColor(color):
+            ui.mark_dirty()
+
+
+def seconds_until_label_change(sim_clock: SimulationClock) -> float:
+    # The sim-time label has minute resolution
+    rate = sim_clock.getSimulationRate()
+    if sim_clock.isPaused() or rate <= 0:
+        return IDLE_FRAME_SECONDS
+    return (60 - sim_clock.getSimulationTime() % 60) / rate
 
 
 def maybe_log_patient_state(patient: Patient, timestamp: float) -> None:
@@ -415,12 +391,12 @@ def maybe_log_patient_state(patient: Patient, timestamp: float) -> None:
 # ----------------------------
 # Main Simulation Loop
 # ----------------------------
-def run_simulation(patient: Patient, sim_clock: SimulationClock) -> None:
+def run_simulation(patient: Patient, sim_clock: SimulationClock, journal: SessionJournal | None = None) -> None:
     dpg.create_context()
     dpg.create_viewport(title="Glucose Simulation", width=900, height=600)
 
     ui = create_ui(patient, sim_clock)
-    _build_carb_modal(patient)
+    _build_carb_modal(patient, sim_clock, journal)
 
     dpg.setup_dearpygui()
     dpg.show_viewport()
@@ -437,50 +413,83 @@ def run_simulation(patient: Patient, sim_clock: SimulationClock) -> None:
 
     sim_clock.setSimulationRate()
 
+    with dpg.handler_registry():
+        dpg.add_key_press_handler(dpg.mvKey_Q, callback=lambda: dpg.stop_dearpygui())
+        dpg.add_key_press_handler(dpg.mvKey_T, callback=lambda: ui.shapes["cgm"].updateShapeColor((255, 0, 0, 255)))
+        # Any interaction brings the loop back to full frame rate
+        dpg.add_key_press_handler(callback=lambda: ui.mark_input_activity())
+        dpg.add_mouse_move_handler(callback=lambda: ui.mark_input_activity())
+        dpg.add_mouse_click_handler(callback=lambda: ui.mark_input_activity())
+        dpg.add_mouse_wheel_handler(callback=lambda: ui.mark_input_activity())
+
+    frame_seconds = ACTIVE_FRAME_SECONDS
     try:
         while dpg.is_dearpygui_running():
-            time.sleep(0.02)
-            sim_clock.updateClock()
-
-            if keyboard.is_pressed("q"):
-                dpg.stop_dearpygui()
-                break
-
-            timestamp = sim_clock.getSimulationTime()
-
-            if keyboard.is_pressed("t"):
-                ui.shapes["cgm"].updateShapeColor((255, 0, 0, 255))
-
-            bg, insulin_dose = update_plots_and_labels(ui, sim_clock, patient, timestamp)
-            apply_visual_state(ui, bg, insulin_dose)
-            maybe_log_patient_state(patient, timestamp)
+            time.sleep(frame_seconds)
+            if not sim_clock.isPaused():
+                sim_clock.updateClock()
+
+                timestamp = sim_clock.getSimulationTime()
+
+                bg, insulin_dose = update_plots_and_labels(ui, sim_clock, patient, timestamp)
+                apply_visual_state(ui, bg, insulin_dose)
+                maybe_log_patient_state(patient, timestamp)
+                if hasattr(patient, "stepOccurred") and patient.stepOccurred():  # type: ignore[attr-defined]
+                    ui.mark_dirty()
+                if journal is not None:
+                    journal.recordTick(timestamp, patient, sim_clock.getSimulationRate())
+
+            # Full rate while patient data or the user is active; otherwise back off towards
+            # IDLE_FRAME_SECONDS, waking early only when the next sim-time label change is due
+            if ui.take_activity():
+                frame_seconds = ACTIVE_FRAME_SECONDS
+            else:
+                frame_seconds = max(
+                    ACTIVE_FRAME_SECONDS,
+                    min(frame_seconds * 2, IDLE_FRAME_SECONDS, seconds_until_label_change(sim_clock)),
+                )
 
             dpg.render_dearpygui_frame()
     finally:
         dpg.destroy_context()
+        if hasattr(patient, "close"):
+            patient.close()  # type: ignore[attr-defined]
+        if journal is not None:
+            journal.close()
+            print(f"Session recorded to {journal.path} (replay with: python SessionJournal.py {journal.path} --verify)")
 
 
 # ----------------------------
 # Entrypoint and Configuration
 # ----------------------------
-def get_user_config() -> Tuple[bool, int]:
-    is_ai_patient = int(input("Enter Patient Type Logic\n1)Ai Patient \n2)Pre simulated\n"))
-    if is_ai_patient == 1:
-        return True, -1
+def get_user_config() -> Tuple[int, int]:
+    patient_logic = int(input("Enter Patient Type Logic\n1)Ai Patient \n2)Pre simulated\n3)Compartmental model\n4)Cohort dashboard\n5)Stream trace file\n"))
+    if patient_logic in (1, 5):
+        return patient_logic, -1
     patient_type = int(input("Enter Patient Type \n1)child \n2)adolescent \n3)Adult\n"))
-    return False, patient_type
+    return patient_logic, patient_type
 
 
 def main() -> None:
-    use_ai, patient_type = get_user_config()
-    if use_ai:
-        patient = AiPatientAdapter()
-    else:
-        patient = Patient(patient_type)
+    parser = argparse.ArgumentParser(description="Interactive glucose simulation")
+    parser.add_argument("--record", action="store_true", help="write a session journal to ./sessions for headless replay")
+    args = parser.parse_args()
+
+    patient_logic, patient_type = get_user_config()
+    if patient_logic == 4:
+        cohort = CompartmentalCohort(int(input("Enter cohort size\n")), patient_type)
+        run_dashboard(cohort, SimulationClock(cohort.simStartTime))
+        return
 
+    mode = PATIENT_LOGIC_MODES.get(patient_logic, "replay")
+    trace_path = input("Enter simglucose trace CSV path\n").strip() if mode == "stream" else None
+    # Seeded explicitly so the session journal can reproduce the noise
+    seed = secrets.randbits(32)
+    patient = createPatient(mode, patient_type, seed, tracePath=trace_path)
     sim_start_time = patient.getSimStartTime()
+    journal = SessionJournal.create(mode, patient_type, seed, sim_start_time, trace_path) if args.record else None
     sim_clock = SimulationClock(sim_start_time)
-    run_simulation(patient, sim_clock)
+    run_simulation(patient, sim_clock, journal)
 
 
 if __name__ == "__main__":
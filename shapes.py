@@ -12,10 +12,17 @@ class Shape:
         self.textLabel = textLabel
         self.textLabelSize = textLabelSize
         self.fill = fillColor
+        self._currentFill = None
         
 
-    def updateShapeColor(self,updatedColor: tuple [int, int ,int ,int]):
+    def updateShapeColor(self,updatedColor: tuple [int, int ,int ,int]) -> bool:
+        # Skip the configure_item call when the color is already set; returns whether it changed
+        updatedColor = tuple(updatedColor)
+        if updatedColor == self._currentFill:
+            return False
+        self._currentFill = updatedColor
         dpg.configure_item(self.tag, fill=updatedColor)
+        return True
 
 class Circle(Shape):
     def __init__(self,center :tuple[int, int], radius :int, fillColor : tuple[int, int, int,int],textLabel : str = "" , textLabelSize: int =14):